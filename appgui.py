@@ -1,8 +1,50 @@
 import tkinter as tk
-from tkinter import messagebox
-from PIL import Image, ImageTk
+from tkinter import messagebox, ttk
 import sys
 import os
+from schedule import preview_slots
+from formulary import SUGGESTION_LIMIT, dosage_text
+from startup import StartupTimer
+from template_cache import TIME_COLUMNS, TREATMENT_NAMES
+
+MAX_TABS = 40
+
+SEARCH_DELAY_MS = 150
+SEARCH_POLL_MS = 20
+
+# Schedule preview grid: redraw delay after the last keystroke, and cell sizes in pixels
+PREVIEW_DELAY_MS = 120
+PREVIEW_LABEL_WIDTH = 130
+PREVIEW_CELL_WIDTH = 18
+PREVIEW_CELL_HEIGHT = 13
+PREVIEW_MAX_HEIGHT = 300
+PREVIEW_HIGHLIGHT = "#FFFF00"
+
+# Main entries: attribute, payload key, placeholder, width, grid row, column, columnspan
+FIELDS = [
+    ("patient_entry", "patient", "Enter Patient Name", 30, 0, 3, 1),
+    ("chart_entry", "chartnum", "Enter Chart Number", 15, 0, 5, 1),
+    ("date_entry", "date", "Enter Date", 15, 0, 7, 1),
+    ("a_entry", "a", "Enter A Value", 15, 1, 1, 1),
+    ("owner_entry", "owner", "Enter Owner Name", 30, 1, 3, 1),
+    ("problem_entry", "problem", "Enter Problem", 30, 1, 5, 2),
+    ("dvm_entry", "dvm", "Enter DVM", 30, 1, 8, 1),
+    ("e_entry", "e", "Enter E Value", 15, 2, 1, 1),
+    ("age_entry", "age", "Enter Age", 15, 2, 3, 1),
+    ("sex_entry", "sex", "Enter Sex", 15, 2, 5, 1),
+    ("ivc_entry", "ivcinfo", "Enter IVC Info", 30, 2, 7, 1),
+    ("techs_entry", "techs", "Enter Techs", 30, 2, 9, 1)
+]
+
+LABELS = [
+    ("Patient:", 0, 2), ("Chart #:", 0, 4), ("Date:", 0, 6),
+    ("A:", 1, 0), ("Owner:", 1, 2), ("Problem:", 1, 4), ("DVM:", 1, 7),
+    ("E:", 2, 0), ("Age:", 2, 2), ("Sex:", 2, 4), ("IVC Size/Site/Date:", 2, 6), ("Techs:", 2, 8)
+]
+
+PROCEDURE_FIELDS = [("date", "Date", 15), ("note", "Procedure", 40)]
+MEDICATION_FIELDS = [("name", "Name", 30), ("dosage", "Dosage", 20), ("start_hour", "Start Hour", 8),
+                     ("frequency", "Frequency", 8)]
 
 def resource_path(relative_path):
     """Get absolute path to resource for PyInstaller"""
@@ -12,147 +54,6 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-def clear_all_fields():
-    # Clear all entry fields
-    patient_entry.delete(0, tk.END)
-    chart_entry.delete(0, tk.END)
-    date_entry.delete(0, tk.END)
-    a_entry.delete(0, tk.END)
-    owner_entry.delete(0, tk.END)
-    problem_entry.delete(0, tk.END)
-    dvm_entry.delete(0, tk.END)
-    e_entry.delete(0, tk.END)
-    age_entry.delete(0, tk.END)
-    sex_entry.delete(0, tk.END)
-    ivc_entry.delete(0, tk.END)
-    techs_entry.delete(0, tk.END)
-    initials_entry.delete(0, tk.END)
-    apply_start_hour.delete(0, tk.END)
-    apply_freq.delete(0, tk.END)
-    
-    # Reset CPR/DNR to default
-    cpr_dnr_var.set("CPR")
-
-    # Clear all treatment fields
-    for treatment in treatment_entries:
-        treatment["start_hour"].delete(0, tk.END)
-        treatment["frequency"].delete(0, tk.END)
-        set_placeholder(treatment["start_hour"], "Start Hour")
-        set_placeholder(treatment["frequency"], "Frequency")
-
-    # Remove all procedures
-    for entry in procedure_entries:
-        entry["date"].destroy()
-        entry["note"].destroy()
-    procedure_entries.clear()
-
-    # Remove all medications
-    for entry in medication_entries:
-        entry["name"].destroy()
-        entry["dosage"].destroy()
-        entry["start_hour"].destroy()
-        entry["frequency"].destroy()
-    medication_entries.clear()
-
-    # Reset placeholders
-    set_placeholder(patient_entry, "Enter Patient Name")
-    set_placeholder(chart_entry, "Enter Chart Number")
-    set_placeholder(date_entry, "Enter Date")
-    set_placeholder(a_entry, "Enter A Value")
-    set_placeholder(owner_entry, "Enter Owner Name")
-    set_placeholder(problem_entry, "Enter Problem")
-    set_placeholder(dvm_entry, "Enter DVM")
-    set_placeholder(e_entry, "Enter E Value")
-    set_placeholder(age_entry, "Enter Age")
-    set_placeholder(sex_entry, "Enter Sex")
-    set_placeholder(ivc_entry, "Enter IVC Info")
-    set_placeholder(techs_entry, "Enter Techs")
-    set_placeholder(initials_entry, "Enter Initials")
-    set_placeholder(apply_start_hour, "Start Hour")
-    set_placeholder(apply_freq, "Frequency")
-
-# Function to collect data and return to the main application
-def collect_data():
-    data = {
-        "cpr_dnr": cpr_dnr_var.get(),
-        "patient": patient_entry.get().strip(),
-        "chartnum": chart_entry.get().strip(),
-        "date": date_entry.get().strip(),
-        "a": a_entry.get().strip(),
-        "owner": owner_entry.get().strip(),
-        "problem": problem_entry.get().strip(),
-        "dvm": dvm_entry.get().strip(),
-        "e": e_entry.get().strip(),
-        "age": age_entry.get().strip(),
-        "sex": sex_entry.get().strip(),
-        "ivcinfo": ivc_entry.get().strip(),
-        "techs": techs_entry.get().strip(),
-        "procedures": [],
-        "treatments": {},
-        "medications": [],
-        "initials": initials_entry.get().strip()
-    }
-
-    # Clean procedure entries
-    for entry in procedure_entries:
-        date = entry["date"].get().strip()
-        note = entry["note"].get().strip()
-        if date or note:
-            if date == "Date":
-                date = ""
-            if note == "Procedure":
-                note = ""
-            data["procedures"].append({"date": date, "note": note})
-
-    # Process all treatments
-    for treatment in treatment_entries:
-        name = treatment["name"]
-        start_hour = treatment["start_hour"].get().strip()
-        frequency = treatment["frequency"].get().strip()
-        
-        # Remove placeholder text if present
-        if start_hour == "Start Hour":
-            start_hour = ""
-        if frequency == "Frequency":
-            frequency = ""
-            
-        data["treatments"][name] = {
-            "start_hour": start_hour,
-            "frequency": frequency
-        }
-
-    # Clean medication entries
-    for med in medication_entries:
-        name = med["name"].get().strip()
-        dosage = med["dosage"].get().strip()
-        start_hour = med["start_hour"].get().strip()
-        frequency = med["frequency"].get().strip()
-        
-        # Remove placeholder text
-        if name == "Name":
-            name = ""
-        if dosage == "Dosage":
-            dosage = ""
-        if start_hour == "Start Hour":
-            start_hour = ""
-        if frequency == "Frequency":
-            frequency = ""
-            
-        if name or dosage or start_hour or frequency:
-            data["medications"].append({
-                "name": name,
-                "dosage": dosage,
-                "start_hour": start_hour,
-                "frequency": frequency
-            })
-
-    # Remove placeholder text from all entries
-    for key in data:
-        if isinstance(data[key], str) and data[key].startswith("Enter "):
-            data[key] = ""
-
-    return data
-
 def set_placeholder(entry, placeholder):
     entry.insert(0, placeholder)
     entry.bind("<FocusIn>", lambda event: clear_placeholder(entry, placeholder))
@@ -169,244 +70,751 @@ def restore_placeholder(entry, placeholder):
         entry.insert(0, placeholder)
         entry.config(fg="grey")
 
-def open_gui(on_submit):
+def reset_entry(entry, placeholder):
+    """Empty an entry back to its placeholder without rebinding its focus handlers"""
+    entry.delete(0, tk.END)
+    entry.insert(0, placeholder)
+    entry.config(fg="grey")
+
+def set_entry(entry, value):
+    """Put a real value in an entry that may be showing its placeholder"""
+    if value:
+        entry.delete(0, tk.END)
+        entry.insert(0, value)
+        entry.config(fg="black")
+
+def entry_value(entry, placeholder):
+    value = entry.get().strip()
+    return "" if value == placeholder else value
+
+class _RowPool:
+    """Procedure or medication rows that are hidden and reused, never destroyed.
+
+    Clearing a form only grid_remove()s its rows, so refilling a tab or
+    switching patients costs no widget creation once the pool is warm. There
+    is no limit: entries past the template's capacity go on continuation sheets.
+    """
+
+    def __init__(self, frame, fields, text, on_change=None, on_create=None):
+        self.frame = frame
+        self.fields = fields
+        self.rows = []
+        self.shown = 0
+        # on_change(index) after a keystroke in a row, on_change(None) when rows appear or disappear
+        self.on_change = on_change or (lambda index: None)
+        # on_create(row, index) once per row, when its entries are first built
+        self.on_create = on_create
+        self.button = tk.Button(frame, text=text, command=self.add)
+        self.button.grid(row=0, column=0, columnspan=len(fields), pady=5)
+
+    def add(self):
+        if self.shown == len(self.rows):
+            row = {}
+            for key, placeholder, width in self.fields:
+                row[key] = tk.Entry(self.frame, width=width)
+                set_placeholder(row[key], placeholder)
+                row[key].bind("<KeyRelease>", lambda event, index=len(self.rows): self.on_change(index), add="+")
+            if self.on_create:
+                self.on_create(row, len(self.rows))
+            self.rows.append(row)
+        row = self.rows[self.shown]
+        for column, (key, placeholder, width) in enumerate(self.fields):
+            row[key].grid(row=self.shown, column=column, padx=2, pady=2)
+        self.shown += 1
+        self.button.grid(row=self.shown)
+        self.on_change(None)
+        return row
+
+    def visible(self):
+        return self.rows[:self.shown]
+
+    def clear(self):
+        for row in self.visible():
+            for key, placeholder, width in self.fields:
+                reset_entry(row[key], placeholder)
+                row[key].grid_remove()
+        self.shown = 0
+        self.button.grid(row=0)
+        self.on_change(None)
+
+    def values(self):
+        return [{key: entry_value(row[key], placeholder) for key, placeholder, width in self.fields}
+                for row in self.visible()]
+
+class _Suggestions:
+    """The drop-down of formulary matches under a medication name entry, one per window.
+
+    The formulary is loaded on its own thread on the first keystroke; until it
+    arrives, typing simply shows nothing. Picking a drug fills in the name and,
+    where they are still empty, its default dosage and frequency.
+    """
+
+    def __init__(self, window, formulary):
+        self.window = window
+        self.root = window.root
+        self.formulary = formulary
+        self.popup = None
+        self.listbox = None
+        self.entry = None
+        self.row = None
+        self.on_choose = None
+        self.matches = []
+        self.waiting = False
+
+    def attach(self, row, on_choose):
+        entry = row["name"]
+        entry.bind("<KeyRelease>", lambda event: self._key(event, row, on_choose), add="+")
+        entry.bind("<Down>", lambda event: self._enter_list())
+        entry.bind("<Escape>", lambda event: self.hide())
+        entry.bind("<FocusOut>", lambda event: self.root.after(SEARCH_DELAY_MS, self._hide_unless_focused), add="+")
+
+    def _key(self, event, row, on_choose):
+        if event.keysym in ("Down", "Up", "Escape", "Return", "Tab"):
+            return
+        self.entry, self.row, self.on_choose = row["name"], row, on_choose
+        self.update()
+
+    def update(self):
+        future = self.formulary.get()
+        if not future.done():
+            if not self.waiting:
+                self.waiting = True
+                self.window.when_done(future, lambda formulary: self._loaded(), what="Formulary")
+            return
+        if future.exception() is not None or self.root.focus_get() is not self.entry:
+            self.hide()
+            return
+        text = entry_value(self.entry, "Name")
+        self.matches = future.result().suggest(text)
+        if not self.matches or (len(self.matches) == 1 and self.matches[0]["name"].lower() == text.lower()):
+            self.hide()
+            return
+        self._show()
+
+    def _loaded(self):
+        self.waiting = False
+        if self.entry is not None:
+            self.update()
+
+    def _show(self):
+        if self.popup is None:
+            self.popup = tk.Toplevel(self.root)
+            self.popup.overrideredirect(True)
+            self.listbox = tk.Listbox(self.popup, width=50, height=SUGGESTION_LIMIT, exportselection=False)
+            self.listbox.pack()
+            self.listbox.bind("<ButtonRelease-1>", lambda event: self.choose())
+            self.listbox.bind("<Return>", lambda event: self.choose())
+            self.listbox.bind("<Escape>", lambda event: self._back_to_entry())
+            self.listbox.bind("<FocusOut>", lambda event: self.root.after(SEARCH_DELAY_MS, self._hide_unless_focused))
+        self.listbox.delete(0, tk.END)
+        for drug in self.matches:
+            frequency = f"q{drug['frequency']}h" if drug["frequency"] else ""
+            self.listbox.insert(tk.END, f"{drug['name']:<30} {dosage_text(drug):<14} {frequency}")
+        self.listbox.configure(height=len(self.matches))
+        self.popup.geometry(f"+{self.entry.winfo_rootx()}+{self.entry.winfo_rooty() + self.entry.winfo_height()}")
+        self.popup.deiconify()
+        self.popup.lift()
+
+    def _enter_list(self):
+        if self.popup is not None and self.popup.winfo_viewable():
+            self.listbox.focus_set()
+            self.listbox.selection_clear(0, tk.END)
+            self.listbox.selection_set(0)
+            self.listbox.activate(0)
+        return "break"
+
+    def _back_to_entry(self):
+        self.hide()
+        if self.entry is not None:
+            self.entry.focus_set()
+
+    def _hide_unless_focused(self):
+        if self.root.focus_get() not in (self.entry, self.listbox):
+            self.hide()
+
+    def hide(self):
+        if self.popup is not None:
+            self.popup.withdraw()
+
+    def choose(self):
+        selection = self.listbox.curselection()
+        if not selection or self.row is None:
+            return
+        drug = self.matches[selection[0]]
+        self.entry.delete(0, tk.END)
+        self.entry.insert(0, drug["name"])
+        self.entry.config(fg="black")
+        # Only a site formulary carries doses; the bundled list is names alone
+        if dosage_text(drug) and not entry_value(self.row["dosage"], "Dosage"):
+            set_entry(self.row["dosage"], dosage_text(drug))
+        if drug["frequency"] and not entry_value(self.row["frequency"], "Frequency"):
+            set_entry(self.row["frequency"], drug["frequency"])
+        self._back_to_entry()
+        self.entry.icursor(tk.END)
+        self.on_choose()
+
+class SchedulePreview:
+    """The sheet's hour columns with every treatment and medication's highlighted slots.
+
+    Slots come from the same TimeLayout.slots_for lookup highlight_cells uses,
+    so the grid matches the generated sheet without openpyxl or the template.
+    Keystrokes only mark their row; after PREVIEW_DELAY_MS the marked rows are
+    redrawn, recolouring just the cells whose highlight changed.
+    """
+
+    def __init__(self, parent, form):
+        self.form = form
+        self.frame = tk.Frame(parent)
+        self.canvas = tk.Canvas(self.frame, width=PREVIEW_LABEL_WIDTH + len(TIME_COLUMNS) * PREVIEW_CELL_WIDTH + 2,
+                                height=PREVIEW_CELL_HEIGHT * 2, bg="white", highlightthickness=0)
+        scrollbar = tk.Scrollbar(self.frame, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        self.canvas.create_text(4, PREVIEW_CELL_HEIGHT, anchor="w", fill="gray",
+                                text="Schedule preview is loading...")
+        self.layout = None
+        self.rows = []       # Drawn rows: canvas item ids plus what they currently show
+        self.shown = 0
+        self.dirty = set()
+        self.all_dirty = True
+        self.pending = None
+
+    def set_layout(self, layout):
+        """Draw the hour header once the template layout is known, then every row"""
+        self.layout = layout
+        self.rows = []
+        self.shown = 0
+        self.canvas.delete("all")
+        self.canvas.configure(width=PREVIEW_LABEL_WIDTH + len(layout.columns) * PREVIEW_CELL_WIDTH + 2)
+        for index, hour in enumerate(layout.hours):
+            x = PREVIEW_LABEL_WIDTH + (index + 0.5) * PREVIEW_CELL_WIDTH
+            self.canvas.create_text(x, PREVIEW_CELL_HEIGHT / 2, text=str(hour), font=("Arial", 7))
+        self.changed(None)
+        self.flush()
+
+    def changed(self, index):
+        """Mark one row (treatments first, then medications), or every row for None, for the next redraw"""
+        if index is None:
+            self.all_dirty = True
+        else:
+            self.dirty.add(index)
+        if self.pending is not None:
+            self.canvas.after_cancel(self.pending)
+        self.pending = self.canvas.after(PREVIEW_DELAY_MS, self.flush)
+
+    def flush(self):
+        if self.pending is not None:
+            self.canvas.after_cancel(self.pending)
+            self.pending = None
+        if self.layout is None:
+            return
+        count = self.form.schedule_count()
+        dirty = range(count) if self.all_dirty else sorted(index for index in self.dirty if index < count)
+        self.all_dirty = False
+        self.dirty.clear()
+        self._show_rows(count)
+        for index in dirty:
+            label, start_hour, frequency = self.form.schedule_item(index)
+            slots = preview_slots(self.layout, start_hour, frequency)
+            self._draw_row(self.rows[index], label, slots)
+
+    def _show_rows(self, count):
+        while len(self.rows) < count:
+            top = PREVIEW_CELL_HEIGHT * (len(self.rows) + 1)
+            row = {"label": self.canvas.create_text(4, top + PREVIEW_CELL_HEIGHT / 2, anchor="w",
+                                                    font=("Arial", 7)),
+                   "cells": [], "slots": frozenset(), "text": None, "invalid": False}
+            for index in range(len(self.layout.columns)):
+                left = PREVIEW_LABEL_WIDTH + index * PREVIEW_CELL_WIDTH
+                row["cells"].append(self.canvas.create_rectangle(
+                    left, top, left + PREVIEW_CELL_WIDTH, top + PREVIEW_CELL_HEIGHT, fill="white", outline="#c8c8c8"))
+            self.rows.append(row)
+        if count == self.shown:
+            return
+        for index, row in enumerate(self.rows):
+            state = "normal" if index < count else "hidden"
+            self.canvas.itemconfigure(row["label"], state=state)
+            for cell in row["cells"]:
+                self.canvas.itemconfigure(cell, state=state)
+        self.shown = count
+        height = PREVIEW_CELL_HEIGHT * (count + 1)
+        self.canvas.configure(height=min(height, PREVIEW_MAX_HEIGHT), scrollregion=(0, 0, 0, height))
+
+    def _draw_row(self, row, label, slots):
+        # None means the values cannot be scheduled: no highlights and a red label, as the sheet would show
+        invalid = slots is None
+        slots = frozenset(slots or ())
+        for index in slots ^ row["slots"]:
+            self.canvas.itemconfigure(row["cells"][index], fill=PREVIEW_HIGHLIGHT if index in slots else "white")
+        row["slots"] = slots
+        if label != row["text"] or invalid != row["invalid"]:
+            self.canvas.itemconfigure(row["label"], text=label[:24], fill="red" if invalid else "black")
+            row["text"] = label
+            row["invalid"] = invalid
+
+class PatientForm:
+    """One patient's sheet: every entry of the original single-patient window, owned by this object"""
+
+    def __init__(self, parent, window):
+        self.frame = tk.Frame(parent)
+        self.window = window
+        self.cpr_dnr_var = tk.StringVar(self.frame, value="CPR")
+        self.on_title = None
+        # Identifies this form's submits to the render queue; a cleared form starts a new patient
+        self.job_source = object()
+
+        tk.Label(self.frame, text="CPR/DNR").grid(row=0, column=0, padx=5, pady=5)
+        tk.OptionMenu(self.frame, self.cpr_dnr_var, "CPR", "DNR").grid(row=0, column=1, padx=5, pady=5)
+        for text, row, column in LABELS:
+            tk.Label(self.frame, text=text).grid(row=row, column=column, padx=5, pady=5)
+        for attribute, key, placeholder, width, row, column, span in FIELDS:
+            entry = tk.Entry(self.frame, width=width)
+            entry.grid(row=row, column=column, columnspan=span, padx=5, pady=5)
+            set_placeholder(entry, placeholder)
+            setattr(self, attribute, entry)
+        self.patient_entry.bind("<KeyRelease>", lambda event: self.refresh_title(), add="+")
+
+        # Procedures Section
+        procedures_frame = tk.LabelFrame(self.frame, text="Procedures", padx=5, pady=5)
+        procedures_frame.grid(row=3, column=0, columnspan=5, padx=10, pady=10, sticky="nsew")
+        self.procedures = _RowPool(procedures_frame, PROCEDURE_FIELDS, "Add Procedure")
+
+        # Treatments Quick Add Section
+        treatments_frame = tk.LabelFrame(self.frame, text="Treatments", padx=5, pady=5)
+        treatments_frame.grid(row=3, column=5, columnspan=5, padx=10, pady=10, sticky="nsew")
+        # Created first so the row callbacks below have somewhere to report to
+        preview_frame = tk.LabelFrame(self.frame, text="Schedule Preview", padx=5, pady=5)
+        preview_frame.grid(row=6, column=0, columnspan=10, padx=10, pady=5, sticky="w")
+        self.preview = SchedulePreview(preview_frame, self)
+        self.preview.frame.grid(row=0, column=0)
+        if window.schedule_layout is not None:
+            self.preview.set_layout(window.schedule_layout)
+
+        quick_add_frame = tk.Frame(treatments_frame)
+        quick_add_frame.grid(row=0, column=0, columnspan=4, pady=5)
+
+        tk.Label(quick_add_frame, text="Quick Add - Start Hour:").grid(row=0, column=0, padx=2)
+        self.apply_start_hour = tk.Entry(quick_add_frame, width=8)
+        self.apply_start_hour.grid(row=0, column=1, padx=2)
+        tk.Label(quick_add_frame, text="Frequency:").grid(row=0, column=2, padx=2)
+        self.apply_freq = tk.Entry(quick_add_frame, width=8)
+        self.apply_freq.grid(row=0, column=3, padx=2)
+        tk.Button(quick_add_frame, text="Apply to All", command=self.apply_to_all_treatments).grid(row=0, column=4, padx=5)
+        set_placeholder(self.apply_start_hour, "Start Hour")
+        set_placeholder(self.apply_freq, "Frequency")
+
+        self.treatment_entries = []
+        for i, treatment in enumerate(TREATMENT_NAMES):
+            tk.Label(treatments_frame, text=treatment, width=15, anchor="w").grid(row=i+1, column=0, padx=2, pady=2)
+            start_hour_entry = tk.Entry(treatments_frame, width=8)
+            frequency_entry = tk.Entry(treatments_frame, width=8)
+            start_hour_entry.grid(row=i+1, column=1, padx=2, pady=2)
+            frequency_entry.grid(row=i+1, column=2, padx=2, pady=2)
+            set_placeholder(start_hour_entry, "Start Hour")
+            set_placeholder(frequency_entry, "Frequency")
+            for entry in (start_hour_entry, frequency_entry):
+                entry.bind("<KeyRelease>", lambda event, index=i: self.preview.changed(index), add="+")
+            self.treatment_entries.append({
+                "name": treatment,
+                "start_hour": start_hour_entry,
+                "frequency": frequency_entry
+            })
+
+        # Medications Section
+        medications_frame = tk.LabelFrame(self.frame, text="Medications", padx=5, pady=5)
+        medications_frame.grid(row=4, column=0, columnspan=10, padx=10, pady=10, sticky="ew")
+        self.medications = _RowPool(medications_frame, MEDICATION_FIELDS, "Add Medication",
+                                    on_change=lambda index: self.preview.changed(
+                                        None if index is None else len(TREATMENT_NAMES) + index),
+                                    on_create=self._attach_suggestions)
+
+        initials_frame = tk.Frame(self.frame)
+        initials_frame.grid(row=5, column=0, columnspan=10, pady=5)
+        tk.Label(initials_frame, text="Initials:").grid(row=0, column=0, padx=5)
+        self.initials_entry = tk.Entry(initials_frame, width=15)
+        self.initials_entry.grid(row=0, column=1, padx=5)
+        set_placeholder(self.initials_entry, "Enter Initials")
+
+    def apply_to_all_treatments(self):
+        start_hour = self.apply_start_hour.get()
+        freq = self.apply_freq.get()
+
+        if start_hour == "Start Hour" or freq == "Frequency":
+            return
+
+        for treatment in self.treatment_entries:
+            if start_hour:
+                set_entry(treatment["start_hour"], start_hour)
+            if freq:
+                set_entry(treatment["frequency"], freq)
+        self.preview.changed(None)
+
+    def _attach_suggestions(self, row, index):
+        if self.window.suggestions is not None:
+            self.window.suggestions.attach(row, lambda: self.preview.changed(len(TREATMENT_NAMES) + index))
+
+    def schedule_count(self):
+        return len(self.treatment_entries) + self.medications.shown
+
+    def schedule_item(self, index):
+        """(label, start hour, frequency) for one preview row: treatments first, then medications"""
+        if index < len(self.treatment_entries):
+            treatment = self.treatment_entries[index]
+            return (treatment["name"], entry_value(treatment["start_hour"], "Start Hour"),
+                    entry_value(treatment["frequency"], "Frequency"))
+        number = index - len(self.treatment_entries)
+        row = self.medications.rows[number]
+        values = {key: entry_value(row[key], placeholder) for key, placeholder, width in MEDICATION_FIELDS}
+        return values["name"] or f"Medication {number + 1}", values["start_hour"], values["frequency"]
+
+    def title(self):
+        return entry_value(self.patient_entry, "Enter Patient Name") or "New Patient"
+
+    def refresh_title(self):
+        if self.on_title:
+            self.on_title(self)
+
+    def is_blank(self):
+        data = self.collect_data()
+        return not (data["patient"] or data["chartnum"])
+
+    def clear(self):
+        self.job_source = object()
+        for attribute, key, placeholder, width, row, column, span in FIELDS:
+            reset_entry(getattr(self, attribute), placeholder)
+        reset_entry(self.initials_entry, "Enter Initials")
+        reset_entry(self.apply_start_hour, "Start Hour")
+        reset_entry(self.apply_freq, "Frequency")
+
+        # Reset CPR/DNR to default
+        self.cpr_dnr_var.set("CPR")
+
+        for treatment in self.treatment_entries:
+            reset_entry(treatment["start_hour"], "Start Hour")
+            reset_entry(treatment["frequency"], "Frequency")
+
+        self.procedures.clear()
+        self.medications.clear()
+        self.preview.changed(None)
+        self.refresh_title()
+
+    def collect_data(self):
+        data = {"cpr_dnr": self.cpr_dnr_var.get()}
+        for attribute, key, placeholder, width, row, column, span in FIELDS:
+            data[key] = entry_value(getattr(self, attribute), placeholder)
+        data["procedures"] = [entry for entry in self.procedures.values() if entry["date"] or entry["note"]]
+        data["treatments"] = {
+            treatment["name"]: {
+                "start_hour": entry_value(treatment["start_hour"], "Start Hour"),
+                "frequency": entry_value(treatment["frequency"], "Frequency")
+            }
+            for treatment in self.treatment_entries
+        }
+        data["medications"] = [med for med in self.medications.values() if any(med.values())]
+        data["initials"] = entry_value(self.initials_entry, "Enter Initials")
+        return data
+
+    def fill(self, data):
+        """Load a saved payload into the form, ready to submit for today.
+
+        The date is left empty so a carried-forward sheet is never stamped with
+        the day it was first written.
+        """
+        self.clear()
+        self.cpr_dnr_var.set(data.get("cpr_dnr") or "CPR")
+        for attribute, key, placeholder, width, row, column, span in FIELDS:
+            if key != "date":
+                set_entry(getattr(self, attribute), data.get(key, ""))
+        set_entry(self.initials_entry, data.get("initials", ""))
+
+        for treatment in self.treatment_entries:
+            values = data.get("treatments", {}).get(treatment["name"], {})
+            set_entry(treatment["start_hour"], values.get("start_hour", ""))
+            set_entry(treatment["frequency"], values.get("frequency", ""))
+
+        for pool, entries in ((self.procedures, data.get("procedures", [])),
+                              (self.medications, data.get("medications", []))):
+            for values in entries:
+                row = pool.add()
+                for key, placeholder, width in pool.fields:
+                    set_entry(row[key], values.get(key, ""))
+        self.preview.changed(None)
+        self.refresh_title()
+
+class PatientTabs:
+    """A notebook of PatientForms. Closed tabs are cleared and kept for the next new patient"""
+
+    def __init__(self, parent, window):
+        self.window = window
+        self.notebook = ttk.Notebook(parent)
+        # Ctrl+Tab / Ctrl+Shift+Tab move between patients
+        self.notebook.enable_traversal()
+        self.forms = []
+        self.spare = []
+
+    def new(self, data=None):
+        if len(self.forms) >= MAX_TABS:
+            messagebox.showerror("Error", f"You can only have {MAX_TABS} patients open.")
+            return None
+        form = self.spare.pop() if self.spare else PatientForm(self.notebook, self.window)
+        form.on_title = self._retitle
+        self.forms.append(form)
+        self.notebook.add(form.frame, text=form.title())
+        if data:
+            form.fill(data)
+        self.notebook.select(form.frame)
+        return form
+
+    def current(self):
+        selected = self.notebook.select()
+        for form in self.forms:
+            if str(form.frame) == selected:
+                return form
+        return None
+
+    def close_current(self):
+        form = self.current()
+        if form is None:
+            return
+        self.notebook.forget(form.frame)
+        self.forms.remove(form)
+        form.clear()
+        self.spare.append(form)
+        if not self.forms:
+            self.new()
+
+    def _retitle(self, form):
+        if form in self.forms:
+            self.notebook.tab(form.frame, text=form.title())
+
+def when_done(root, future, callback, what="Patient lookup", on_failure=None):
+    """Call callback(result) on the Tk thread once a background Future finishes"""
+    if not future.done():
+        root.after(SEARCH_POLL_MS, when_done, root, future, callback, what, on_failure)
+        return
+    try:
+        result = future.result()
+    except Exception as e:
+        print(f"{what} error: {str(e)}")
+        if on_failure:
+            on_failure(f"{what} failed")
+        return
+    callback(result)
+
+class FlowSheetWindow:
+    """The main window's shared state: the status line, the patient tabs and what every tab draws on"""
+
+    def __init__(self, root):
+        self.root = root
+        self.status_var = tk.StringVar(root, value="Ready")
+        self.tabs = None
+        self.schedule_layout = None
+        self.suggestions = None
+
+    def when_done(self, future, callback, what="Patient lookup"):
+        """when_done on this window, reporting a failure in the status line"""
+        when_done(self.root, future, callback, what, self.set_status)
+
+    def set_status(self, text):
+        """Show text in the status line under the Submit button"""
+        self.status_var.set(text)
+
+    def show_patient_window(self, data=None):
+        """Bring the window forward with a patient tab ready: the current one if blank, else a new one"""
+        self.root.deiconify()
+        self.root.lift()
+        self.root.focus_force()
+        form = self.tabs.current()
+        if form is not None and form.is_blank():
+            if data:
+                form.fill(data)
+        else:
+            self.tabs.new(data)
+
+    def set_schedule_layout(self, layout):
+        """Hand the template's TimeLayout to every form's preview, including spare ones"""
+        self.schedule_layout = layout
+        if self.tabs is not None:
+            for form in self.tabs.forms + self.tabs.spare:
+                form.preview.set_layout(layout)
+
+def load_icon():
+    """The 32x32 window logo, from the pre-rendered PNG so PIL is not needed at startup"""
+    try:
+        return tk.PhotoImage(file=resource_path('icon32.png'))
+    except tk.TclError:
+        # Fall back to scaling icon.ico when running without the pre-rendered PNG
+        from PIL import Image, ImageTk
+        icon_image = Image.open(resource_path('icon.ico'))
+        icon_image = icon_image.resize((32, 32)) # Size of kitty kat
+        return ImageTk.PhotoImage(icon_image)
+
+def open_gui(on_submit, timer=None, on_ready=None, on_create=None, store=None, preview_layout=None,
+             formulary=None):
+    """Open the tabbed window; on_submit(data, source) gets the current tab's payload and form identity.
+
+    Every tab shares the one backend behind on_submit, so renders for any
+    patient go through the same warm queue. preview_layout is a Future that
+    resolves to the template's TimeLayout; the schedule previews stay empty
+    until it does. formulary (a BackgroundFormulary) drives the medication
+    name suggestions. on_create(window) gets the FlowSheetWindow as soon as
+    its Tk root exists.
+    """
+    if timer is None:
+        timer = StartupTimer(enabled=False)
+
     root = tk.Tk()
     root.title("Gregg's Flow Sheet Generator")
-    
+    timer.mark("tk init")
+    window = FlowSheetWindow(root)
+    set_status = window.set_status
+    if on_create:
+        on_create(window)
+
     # Set window icon
     try:
         root.iconbitmap(resource_path('icon.ico'))
     except tk.TclError:
         print("Warning: icon.ico not found")
 
-    # Declare all global variables
-    global cpr_dnr_var, patient_entry, chart_entry, date_entry, a_entry, owner_entry
-    global problem_entry, dvm_entry, e_entry, age_entry, sex_entry, ivc_entry, techs_entry
-    global initials_entry, procedure_entries, treatment_entries, medication_entries
-    global apply_start_hour, apply_freq
-
-    # Initialize entry variables
-    cpr_dnr_var = tk.StringVar(value="CPR")
-    patient_entry = tk.Entry(root, width=30)
-    chart_entry = tk.Entry(root, width=15)
-    date_entry = tk.Entry(root, width=15)
-    a_entry = tk.Entry(root, width=15)
-    owner_entry = tk.Entry(root, width=30)
-    problem_entry = tk.Entry(root, width=30)
-    dvm_entry = tk.Entry(root, width=30)
-    e_entry = tk.Entry(root, width=15)
-    age_entry = tk.Entry(root, width=15)
-    sex_entry = tk.Entry(root, width=15)
-    ivc_entry = tk.Entry(root, width=30)
-    techs_entry = tk.Entry(root, width=30)
-    initials_entry = tk.Entry(root, width=15)
-
-    procedure_entries = []
-    treatment_entries = []
-    medication_entries = []
-
-    # First Row - Patient Info
-    tk.Label(root, text="CPR/DNR").grid(row=0, column=0, padx=5, pady=5)
-    tk.OptionMenu(root, cpr_dnr_var, "CPR", "DNR").grid(row=0, column=1, padx=5, pady=5)
-    
-    tk.Label(root, text="Patient:").grid(row=0, column=2, padx=5, pady=5)
-    patient_entry.grid(row=0, column=3, padx=5, pady=5)
-    
-    tk.Label(root, text="Chart #:").grid(row=0, column=4, padx=5, pady=5)
-    chart_entry.grid(row=0, column=5, padx=5, pady=5)
-    
-    tk.Label(root, text="Date:").grid(row=0, column=6, padx=5, pady=5)
-    date_entry.grid(row=0, column=7, padx=5, pady=5)
-
-    # Second Row
-    tk.Label(root, text="A:").grid(row=1, column=0, padx=5, pady=5)
-    a_entry.grid(row=1, column=1, padx=5, pady=5)
-    
-    tk.Label(root, text="Owner:").grid(row=1, column=2, padx=5, pady=5)
-    owner_entry.grid(row=1, column=3, padx=5, pady=5)
-    
-    tk.Label(root, text="Problem:").grid(row=1, column=4, padx=5, pady=5)
-    problem_entry.grid(row=1, column=5, columnspan=2, padx=5, pady=5)
-    
-    tk.Label(root, text="DVM:").grid(row=1, column=7, padx=5, pady=5)
-    dvm_entry.grid(row=1, column=8, padx=5, pady=5)
-
-    # Third Row
-    tk.Label(root, text="E:").grid(row=2, column=0, padx=5, pady=5)
-    e_entry.grid(row=2, column=1, padx=5, pady=5)
-    
-    tk.Label(root, text="Age:").grid(row=2, column=2, padx=5, pady=5)
-    age_entry.grid(row=2, column=3, padx=5, pady=5)
-    
-    tk.Label(root, text="Sex:").grid(row=2, column=4, padx=5, pady=5)
-    sex_entry.grid(row=2, column=5, padx=5, pady=5)
-    
-    tk.Label(root, text="IVC Size/Site/Date:").grid(row=2, column=6, padx=5, pady=5)
-    ivc_entry.grid(row=2, column=7, padx=5, pady=5)
-    
-    tk.Label(root, text="Techs:").grid(row=2, column=8, padx=5, pady=5)
-    techs_entry.grid(row=2, column=9, padx=5, pady=5)
-
-    # Create frames for sections
-    procedures_frame = tk.LabelFrame(root, text="Procedures", padx=5, pady=5)
-    procedures_frame.grid(row=3, column=0, columnspan=5, padx=10, pady=10, sticky="nsew")
-
-    treatments_frame = tk.LabelFrame(root, text="Treatments", padx=5, pady=5)
-    treatments_frame.grid(row=3, column=5, columnspan=5, padx=10, pady=10, sticky="nsew")
-
-    # Procedures Section
-    def add_procedure():
-        if len(procedure_entries) >= 6:
-            messagebox.showerror("Error", "You can only add up to 6 procedures.")
-            return
+    if formulary is not None:
+        window.suggestions = _Suggestions(window, formulary)
 
-        row = len(procedure_entries)
-        date_entry = tk.Entry(procedures_frame, width=15)
-        note_entry = tk.Entry(procedures_frame, width=40)
-        
-        date_entry.grid(row=row, column=0, padx=2, pady=2)
-        note_entry.grid(row=row, column=1, padx=2, pady=2)
-        
-        set_placeholder(date_entry, "Date")
-        set_placeholder(note_entry, "Procedure")
-        
-        procedure_entries.append({"date": date_entry, "note": note_entry})
-
-    tk.Button(procedures_frame, text="Add Procedure", command=add_procedure).grid(row=6, column=0, columnspan=2, pady=5)
-
-    # Treatments Quick Add Section
-    quick_add_frame = tk.Frame(treatments_frame)
-    quick_add_frame.grid(row=0, column=0, columnspan=4, pady=5)
-
-    tk.Label(quick_add_frame, text="Quick Add - Start Hour:").grid(row=0, column=0, padx=2)
-    apply_start_hour = tk.Entry(quick_add_frame, width=8)
-    apply_start_hour.grid(row=0, column=1, padx=2)
-    
-    tk.Label(quick_add_frame, text="Frequency:").grid(row=0, column=2, padx=2)
-    apply_freq = tk.Entry(quick_add_frame, width=8)
-    apply_freq.grid(row=0, column=3, padx=2)
-
-    def apply_to_all_treatments():
-        start_hour = apply_start_hour.get()
-        freq = apply_freq.get()
-        
-        if start_hour == "Start Hour" or freq == "Frequency":
-            return
-            
-        for treatment in treatment_entries:
-            if start_hour:
-                treatment["start_hour"].delete(0, tk.END)
-                treatment["start_hour"].insert(0, start_hour)
-                treatment["start_hour"].config(fg="black")
-            if freq:
-                treatment["frequency"].delete(0, tk.END)
-                treatment["frequency"].insert(0, freq)
-                treatment["frequency"].config(fg="black")
-
-    tk.Button(quick_add_frame, text="Apply to All", command=apply_to_all_treatments).grid(row=0, column=4, padx=5)
-
-    # Add treatments
-    treatments = [
-        "Temperature", "Pulse", "Respiratory Rate", "MMCRT", "IV Fluids / Rate", "Additives",
-        "Check IVC", "Walk/Litter", "Urine (+/-)", "Stool (+/-)", "Vomit (+/-)", "Food / Water"
-    ]
-
-    for i, treatment in enumerate(treatments):
-        tk.Label(treatments_frame, text=treatment, width=15, anchor="w").grid(row=i+1, column=0, padx=2, pady=2)
-        start_hour_entry = tk.Entry(treatments_frame, width=8)
-        frequency_entry = tk.Entry(treatments_frame, width=8)
-        
-        start_hour_entry.grid(row=i+1, column=1, padx=2, pady=2)
-        frequency_entry.grid(row=i+1, column=2, padx=2, pady=2)
-        
-        set_placeholder(start_hour_entry, "Start Hour")
-        set_placeholder(frequency_entry, "Frequency")
-        
-        treatment_entries.append({
-            "name": treatment,
-            "start_hour": start_hour_entry,
-            "frequency": frequency_entry
-        })
-
-    # Medications Section
-    medications_frame = tk.LabelFrame(root, text="Medications", padx=5, pady=5)
-    medications_frame.grid(row=4, column=0, columnspan=10, padx=10, pady=10, sticky="ew")
-
-    def add_medication():
-        if len(medication_entries) >= 8:
-            messagebox.showerror("Error", "You can only add up to 8 medications.")
-            return
+    tabs = window.tabs = PatientTabs(root, window)
+    tabs.notebook.grid(row=0, column=0, padx=5, pady=5, sticky="nsew")
+    tabs.new()
 
-        row = len(medication_entries)
-        name_entry = tk.Entry(medications_frame, width=30)
-        dosage_entry = tk.Entry(medications_frame, width=20)
-        start_hour_entry = tk.Entry(medications_frame, width=8)
-        frequency_entry = tk.Entry(medications_frame, width=8)
-        
-        name_entry.grid(row=row, column=0, padx=2, pady=2)
-        dosage_entry.grid(row=row, column=1, padx=2, pady=2)
-        start_hour_entry.grid(row=row, column=2, padx=2, pady=2)
-        frequency_entry.grid(row=row, column=3, padx=2, pady=2)
-        
-        set_placeholder(name_entry, "Name")
-        set_placeholder(dosage_entry, "Dosage")
-        set_placeholder(start_hour_entry, "Start Hour")
-        set_placeholder(frequency_entry, "Frequency")
-        
-        medication_entries.append({
-            "name": name_entry,
-            "dosage": dosage_entry,
-            "start_hour": start_hour_entry,
-            "frequency": frequency_entry
-        })
-
-    tk.Button(medications_frame, text="Add Medication", command=add_medication).grid(row=8, column=0, columnspan=4, pady=5)
-
-    # Bottom section with Initials, Submit, and Icon
+    # Bottom section with Submit, tab buttons and Icon, shared by every tab
     bottom_frame = tk.Frame(root)
-    bottom_frame.grid(row=5, column=0, columnspan=10, pady=10)
-
-    tk.Label(bottom_frame, text="Initials:").grid(row=0, column=0, padx=5)
-    initials_entry = tk.Entry(bottom_frame, width=15) # Make sure entry is created in bottom_frame
-    initials_entry.grid(row=0, column=1, padx=5)
-    tk.Button(bottom_frame, text="Submit", command=lambda: on_submit(collect_data())).grid(row=0, column=2, padx=5)
-    tk.Button(bottom_frame, text="Clear", command=clear_all_fields).grid(row=0, column=3, padx=5)
+    bottom_frame.grid(row=1, column=0, pady=10)
+
+    def submit_current():
+        form = tabs.current()
+        on_submit(form.collect_data(), form.job_source)
+
+    tk.Button(bottom_frame, text="Submit", command=submit_current).grid(row=0, column=0, padx=5)
+    tk.Button(bottom_frame, text="Clear", command=lambda: tabs.current().clear()).grid(row=0, column=1, padx=5)
+    tk.Button(bottom_frame, text="New Patient", command=tabs.new).grid(row=0, column=2, padx=5)
+    tk.Button(bottom_frame, text="Close Tab", command=tabs.close_current).grid(row=0, column=3, padx=5)
+    tk.Label(bottom_frame, textvariable=window.status_var, fg="gray").grid(row=1, column=0, columnspan=4, sticky="w", padx=5)
+
+    # Past patients: prefix search and next-day carry-forward, all queries on the store's thread
+    if store is not None:
+        find_entry = tk.Entry(bottom_frame, width=30)
+        find_entry.grid(row=0, column=5, padx=5)
+        results_list = tk.Listbox(bottom_frame, width=60, height=6)
+        results = []
+        search = {"pending": None}
+
+        def show_results(query, rows):
+            if query != find_entry.get().strip():
+                return  # The text changed while this lookup ran
+            results[:] = rows
+            results_list.delete(0, tk.END)
+            for row in rows:
+                results_list.insert(tk.END, f"{row['chartnum']:<10} {row['patient']:<30} {row['saved_day']}")
+            if rows:
+                results_list.grid(row=2, column=0, columnspan=8, sticky="w", padx=5)
+            else:
+                results_list.grid_remove()
+
+        def run_search():
+            search["pending"] = None
+            query = find_entry.get().strip()
+            if not query or query == "Search Chart # or Patient":
+                show_results(query, [])
+                return
+            window.when_done(store.search(query), lambda rows: show_results(query, rows))
+
+        def on_find_key(event):
+            if search["pending"] is not None:
+                root.after_cancel(search["pending"])
+            search["pending"] = root.after(SEARCH_DELAY_MS, run_search)
+
+        def load_selected(event=None):
+            selection = results_list.curselection()
+            if not selection:
+                return
+            row = results[selection[0]]
+
+            def loaded(data):
+                if not data:
+                    return
+                # A blank tab takes the patient; otherwise they get a tab of their own
+                form = tabs.current()
+                if form is not None and form.is_blank():
+                    form.fill(data)
+                elif tabs.new(data) is None:
+                    return
+                set_status(f"Loaded {row['patient'] or row['chartnum']} from {row['saved_day']}")
+
+            window.when_done(store.load(row["id"]), loaded)
+            results_list.grid_remove()
+
+        def load_yesterday():
+            form = tabs.current()
+            chart = entry_value(form.chart_entry, "Enter Chart Number")
+            if not chart:
+                set_status("Enter a chart number to load its previous orders")
+                return
+
+            def loaded(found):
+                if found is None:
+                    set_status(f"No earlier orders saved for chart {chart}")
+                    return
+                day, data = found
+                if form in tabs.forms:
+                    form.fill(data)
+                    set_status(f"Loaded orders from {day} for chart {chart}; enter today's date and submit")
+
+            window.when_done(store.previous_orders(chart), loaded)
+
+        find_entry.bind("<KeyRelease>", on_find_key)
+        results_list.bind("<Double-Button-1>", load_selected)
+        results_list.bind("<Return>", load_selected)
+        tk.Button(bottom_frame, text="Load Yesterday", command=load_yesterday).grid(row=0, column=6, padx=5)
+        set_placeholder(find_entry, "Search Chart # or Patient")
+    if preview_layout is not None:
+        window.when_done(preview_layout, window.set_schedule_layout, what="Schedule preview")
+    timer.mark("widget build")
 
     # Icon and Version
     try:
-        icon_image = Image.open(resource_path('icon.ico'))
-        icon_image = icon_image.resize((32, 32)) # Size of kitty kat
-        icon_photo = ImageTk.PhotoImage(icon_image)
+        icon_photo = load_icon()
         icon_label = tk.Label(bottom_frame, image=icon_photo)
         icon_label.image = icon_photo  # Keep a reference!
         icon_label.grid(row=0, column=4, padx=20) # Adjust column
-        
+
         version_label = tk.Label(bottom_frame, text="v0.1", font=("Arial", 12, "bold"))
         version_label.grid(row=1, column=4) # Adjust column
     except Exception as e:
         print(f"Error loading icon: {e}")
+    timer.mark("icon")
+
+    def on_first_expose(event):
+        root.unbind("<Expose>")
+        # Let the exposed widgets finish drawing before calling it painted
+        root.after_idle(on_first_paint)
 
-    # Set placeholders for all main entries
-    set_placeholder(patient_entry, "Enter Patient Name")
-    set_placeholder(chart_entry, "Enter Chart Number")
-    set_placeholder(date_entry, "Enter Date")
-    set_placeholder(a_entry, "Enter A Value")
-    set_placeholder(owner_entry, "Enter Owner Name")
-    set_placeholder(problem_entry, "Enter Problem")
-    set_placeholder(dvm_entry, "Enter DVM")
-    set_placeholder(e_entry, "Enter E Value")
-    set_placeholder(age_entry, "Enter Age")
-    set_placeholder(sex_entry, "Enter Sex")
-    set_placeholder(ivc_entry, "Enter IVC Info")
-    set_placeholder(techs_entry, "Enter Techs")
-    set_placeholder(initials_entry, "Enter Initials")
-    set_placeholder(apply_start_hour, "Start Hour")
-    set_placeholder(apply_freq, "Frequency")
+    painted = []
 
+    def on_first_paint():
+        if painted:
+            return
+        painted.append(True)
+        timer.mark("first paint")
+        timer.report()
+        if on_ready:
+            on_ready(root)
+
+    root.bind("<Expose>", on_first_expose)
+    # A window started minimized is never exposed; still hand over after a moment
+    root.after(1000, on_first_paint)
     root.mainloop()
 
 if __name__ == "__main__":
-    def dummy_submit(data):
+    def dummy_submit(data, source=None):
         print("Collected Data:", data)
 
-    open_gui(dummy_submit)
\ No newline at end of file
+    open_gui(dummy_submit)
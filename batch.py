@@ -0,0 +1,231 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# Keys produced by appgui.collect_data(), with their empty defaults
+PAYLOAD_DEFAULTS = {
+    "cpr_dnr": "",
+    "patient": "",
+    "chartnum": "",
+    "date": "",
+    "a": "",
+    "owner": "",
+    "problem": "",
+    "dvm": "",
+    "e": "",
+    "age": "",
+    "sex": "",
+    "ivcinfo": "",
+    "techs": "",
+    "procedures": [],
+    "treatments": {},
+    "medications": [],
+    "initials": ""
+}
+
+NESTED_KEYS = ("procedures", "treatments", "medications")
+
+def _normalize_entry(key, entry):
+    """One procedure, medication or treatment entry as a dict of strings"""
+    if not isinstance(entry, dict):
+        raise ValueError(f"Entries in '{key}' must be objects, got {type(entry).__name__}")
+    normalized = {}
+    for field, value in entry.items():
+        if isinstance(value, (dict, list)):
+            raise ValueError(f"Field '{field}' in '{key}' must be text, got {type(value).__name__}")
+        normalized[field] = "" if value is None else str(value)
+    return normalized
+
+def normalize_payload(record):
+    """Coerce a raw record into the collect_data() shape"""
+    if not isinstance(record, dict):
+        raise ValueError(f"Expected an object, got {type(record).__name__}")
+
+    data = {}
+    for key, default in PAYLOAD_DEFAULTS.items():
+        value = record.get(key, default)
+        if key in NESTED_KEYS:
+            # CSV cells carry nested fields as JSON text
+            if isinstance(value, str):
+                try:
+                    value = json.loads(value) if value.strip() else default
+                except ValueError:
+                    raise ValueError(f"Field '{key}' is not valid JSON")
+            if not isinstance(value, type(default)):
+                raise ValueError(f"Field '{key}' must be a {type(default).__name__}")
+            if key == "treatments":
+                value = {name: _normalize_entry(key, entry) for name, entry in value.items()}
+            else:
+                value = [_normalize_entry(key, entry) for entry in value]
+        elif value is None:
+            value = ""
+        else:
+            value = str(value)
+        data[key] = value
+    return data
+
+def load_records(input_path):
+    """Yield (record number, payload or None, error or None) for a JSONL or CSV file"""
+    if input_path.lower().endswith(".csv"):
+        with open(input_path, newline="", encoding="utf-8-sig") as f:
+            for number, row in enumerate(csv.DictReader(f), start=1):
+                try:
+                    yield number, normalize_payload(row), None
+                except (ValueError, TypeError) as e:
+                    yield number, None, str(e)
+    else:
+        with open(input_path, encoding="utf-8") as f:
+            number = 0
+            for line in f:
+                if not line.strip():
+                    continue
+                number += 1
+                try:
+                    yield number, normalize_payload(json.loads(line)), None
+                except (ValueError, TypeError) as e:
+                    yield number, None, str(e)
+
+def unique_output_path(output_dir, filename, used):
+    """Avoid two records with the same patient name overwriting each other"""
+    from flowsheet import safe_filename
+
+    filename = safe_filename(filename)
+    base, ext = os.path.splitext(filename)
+    candidate = filename
+    suffix = 2
+    while candidate.lower() in used:
+        candidate = f"{base}-{suffix}{ext}"
+        suffix += 1
+    used.add(candidate.lower())
+    return os.path.join(output_dir, candidate)
+
+def render_record(number, data, output_path, engine=None, use_cache=True):
+    """Worker entry point: render one payload straight to disk"""
+    from flowsheet import render_bytes
+    from render_cache import fetch_cached
+    from style_registry import style_report
+
+    started = time.perf_counter()
+    try:
+        if use_cache:
+            content, cached = fetch_cached(data, engine)
+        else:
+            content, cached = render_bytes(data, engine), False
+        with open(output_path, "wb") as f:
+            f.write(content)
+    except Exception as e:
+        return {"record": number, "patient": data.get("patient", ""), "path": None,
+                "seconds": time.perf_counter() - started, "error": str(e)}
+    return {"record": number, "patient": data.get("patient", ""), "path": output_path,
+            "seconds": time.perf_counter() - started, "error": None, "cached": cached,
+            "styles": style_report(content)["cell_styles"]}
+
+def _report(result):
+    if result["error"]:
+        print(f"Record {result['record']}: failed after {result['seconds']:.3f}s ({result['error']})")
+    else:
+        print(f"Record {result['record']}: {os.path.basename(result['path'])} in {result['seconds']:.3f}s "
+              f"({result['styles']} cell styles{', cached' if result['cached'] else ''})")
+
+def _render_group(jobs, workers, engine, use_cache, results):
+    """Render (number, data, output_path) jobs on one pool, adding to results.
+
+    Returns the jobs left unfinished because a worker process died and broke the pool.
+    """
+    unfinished = []
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(jobs))) as executor:
+        futures = {}
+        for index, job in enumerate(jobs):
+            try:
+                futures[executor.submit(render_record, *job, engine, use_cache)] = job
+            except BrokenProcessPool:
+                unfinished.extend(jobs[index:])
+                break
+
+        for future in as_completed(futures):
+            number, data, output_path = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                unfinished.append(futures[future])
+                continue
+            except Exception as e:
+                result = {"record": number, "patient": data.get("patient", ""), "path": None,
+                          "seconds": 0.0, "error": f"worker failed: {e}"}
+            _report(result)
+            results.append(result)
+    unfinished.sort(key=lambda job: job[0])
+    return unfinished
+
+def run_batch(input_path, output_dir, workers=None, engine=None, use_cache=True):
+    """Render every record in input_path into output_dir and return per-record results"""
+    from flowsheet import default_filename
+
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    used_names = set()
+    started = time.perf_counter()
+
+    jobs = []
+    for number, data, error in load_records(input_path):
+        if error:
+            print(f"Record {number}: skipped ({error})")
+            results.append({"record": number, "patient": "", "path": None,
+                            "seconds": 0.0, "error": error})
+            continue
+        jobs.append((number, data, unique_output_path(output_dir, default_filename(data), used_names)))
+
+    # A worker process that dies breaks its whole pool and fails every record still
+    # outstanding there. Those go round again on a fresh pool, split in half each
+    # time, so only a record that breaks a pool on its own is reported as failed.
+    groups = [jobs] if jobs else []
+    restarts = 0
+    while groups:
+        group = groups.pop(0)
+        unfinished = _render_group(group, workers, engine, use_cache, results)
+        if not unfinished:
+            continue
+        if len(group) == 1:
+            number, data, output_path = group[0]
+            result = {"record": number, "patient": data.get("patient", ""), "path": None,
+                      "seconds": 0.0, "error": "worker process died"}
+            _report(result)
+            results.append(result)
+            continue
+        restarts += 1
+        print(f"A worker process died; retrying {len(unfinished)} unfinished record(s) on a new pool")
+        half = (len(unfinished) + 1) // 2
+        groups[:0] = [part for part in (unfinished[:half], unfinished[half:]) if part]
+
+    elapsed = time.perf_counter() - started
+    results.sort(key=lambda r: r["record"])
+    rendered = [r for r in results if not r["error"]]
+    failed = len(results) - len(rendered)
+    throughput = len(rendered) / elapsed if elapsed > 0 else 0.0
+    cached = sum(1 for r in rendered if r["cached"])
+    print(f"Rendered {len(rendered)} sheet(s) ({cached} from cache), {failed} failed, in {elapsed:.2f}s "
+          f"({throughput:.1f} sheets/sec)")
+    if restarts:
+        print(f"Restarted the worker pool {restarts} time(s) after a worker process died")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="app.py batch",
+        description="Render flow sheets for many patients from a JSONL or CSV file")
+    parser.add_argument("input", help="JSONL or CSV file of collect_data() payloads")
+    parser.add_argument("output_dir", help="Directory to write the generated sheets into")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--engine", choices=["openpyxl", "xlsxpatch"], default=None,
+                        help="Rendering engine (default: $FLOWSHEET_ENGINE or openpyxl)")
+    parser.add_argument("--no-cache", action="store_true", help="Render every record even if unchanged")
+    args = parser.parse_args(argv)
+
+    results = run_batch(args.input, args.output_dir, workers=args.workers, engine=args.engine,
+                        use_cache=not args.no_cache)
+    return 1 if any(r["error"] for r in results) else 0
@@ -0,0 +1,635 @@
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from instrumentation import percentile
+from template_cache import TREATMENT_NAMES
+
+ENGINES = ("openpyxl", "xlsxpatch")
+
+def synthetic_payload(rng, index=0, max_medications=8, max_procedures=6):
+    """A random patient payload shaped like appgui.collect_data() output"""
+    def schedule():
+        return {"start_hour": str(rng.randint(1, 12)), "frequency": str(rng.choice([1, 2, 3, 4, 6, 8, 12, 24]))}
+
+    return {
+        "cpr_dnr": rng.choice(["CPR", "DNR"]),
+        "patient": f"Patient {index}",
+        "chartnum": str(100000 + index),
+        "date": "01/01",
+        "a": str(rng.randint(0, 9)),
+        "owner": f"Owner {index}",
+        "problem": "Post-op monitoring",
+        "dvm": "Dr. Smith",
+        "e": str(rng.randint(0, 9)),
+        "age": f"{rng.randint(1, 18)}y",
+        "sex": rng.choice(["MN", "FS", "M", "F"]),
+        "ivcinfo": "22g L cephalic",
+        "techs": "AB/CD",
+        "procedures": [{"date": f"01/{day + 1:02d}", "note": f"Procedure {day + 1}"}
+                       for day in range(rng.randint(0, max_procedures))],
+        "treatments": {name: schedule() for name in TREATMENT_NAMES},
+        "medications": [dict(name=f"Drug {n}", dosage=f"{rng.randint(1, 500)} mg", **schedule())
+                        for n in range(rng.randint(0, max_medications))],
+        "initials": "XY"
+    }
+
+def synthetic_payloads(count, seed=0, **limits):
+    rng = random.Random(seed)
+    return [synthetic_payload(rng, index, **limits) for index in range(count)]
+
+def peak_rss_mb():
+    """Peak resident set size of this process, where the platform reports it"""
+    # ru_maxrss survives exec on Linux and would report the parent's peak, VmHWM does not
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _cell_snapshot(cell):
+    fill = cell.fill
+    return (
+        cell.value if cell.value != "" else None,
+        fill.fill_type, fill.fgColor.rgb if fill.fill_type else None,
+        repr(cell.font), repr(cell.border), repr(cell.alignment), cell.number_format
+    )
+
+def _merged_interiors(content):
+    """Coordinates covered by a merged range other than its top-left anchor"""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(io.BytesIO(content))
+    interiors = set()
+    for sheet in workbook.worksheets:
+        for merged_range in sheet.merged_cells.ranges:
+            for row, col in merged_range.cells:
+                if (row, col) != (merged_range.min_row, merged_range.min_col):
+                    interiors.add(f"{sheet.title}!{sheet.cell(row, col).coordinate}")
+    return interiors
+
+def compare_workbooks(first, second):
+    """Cell-by-cell differences between two rendered xlsx byte strings"""
+    import openpyxl
+    from openpyxl.cell.read_only import ReadOnlyCell
+
+    snapshots = []
+    defaults = []
+    for content in (first, second):
+        # Read-only mode keeps the styles of cells inside merged ranges
+        workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True)
+        cells = {}
+        for sheet in workbook.worksheets:
+            for row in sheet.iter_rows():
+                for cell in row:
+                    if hasattr(cell, "coordinate"):
+                        cells[f"{sheet.title}!{cell.coordinate}"] = _cell_snapshot(cell)
+        # A cell one writer omits is an empty cell in the default style
+        defaults.append(_cell_snapshot(ReadOnlyCell(workbook.worksheets[0], 1, 1, None, 0)))
+        workbook.close()
+        snapshots.append(cells)
+
+    # Only the anchor of a merged range is displayed, so the rest just need the same value and fill
+    interiors = _merged_interiors(first)
+
+    differences = []
+    for key in sorted(set(snapshots[0]) | set(snapshots[1])):
+        left = snapshots[0].get(key, defaults[0])
+        right = snapshots[1].get(key, defaults[1])
+        if key in interiors:
+            left, right = left[:3], right[:3]
+        if left != right:
+            differences.append((key, left, right))
+    return differences
+
+def check_engines(payloads):
+    """Render every payload with both engines and report any cell that differs"""
+    from flowsheet import render_bytes
+
+    failures = 0
+    for index, data in enumerate(payloads):
+        differences = compare_workbooks(render_bytes(data, "openpyxl"), render_bytes(data, "xlsxpatch"))
+        if differences:
+            failures += 1
+            print(f"Payload {index}: {len(differences)} cell(s) differ, first: {differences[0]}")
+    print(f"Equivalence: {len(payloads) - failures}/{len(payloads)} payloads identical")
+    return failures == 0
+
+def _engine_run(engine, count, seed):
+    """Child process body: render count sheets and report timings and peak RSS"""
+    # flowsheet imports neither the GUI nor openpyxl, so xlsxpatch's peak RSS is its own
+    from flowsheet import render_bytes
+
+    payloads = synthetic_payloads(count, seed)
+    render_bytes(payloads[0], engine)  # warm the template caches
+    latencies = []
+    for data in payloads:
+        started = time.perf_counter()
+        render_bytes(data, engine)
+        latencies.append(time.perf_counter() - started)
+    return {"engine": engine, "latencies": latencies, "peak_rss_mb": peak_rss_mb()}
+
+def bench_engines(count, seed):
+    """Run each engine in a fresh process so peak RSS is not shared between them"""
+    results = []
+    for engine in ENGINES:
+        output = subprocess.run(
+            [sys.executable, __file__, "_engine-run", engine, str(count), str(seed)],
+            check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'engine':<10} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'peak RSS MB':>12}")
+    for result in results:
+        latencies = result["latencies"]
+        rss = result["peak_rss_mb"]
+        print(f"{result['engine']:<10} {percentile(latencies, 50) * 1000:>8.2f} "
+              f"{percentile(latencies, 95) * 1000:>8.2f} {statistics.mean(latencies) * 1000:>8.2f} "
+              f"{rss if rss is None else f'{rss:.1f}':>12}")
+    return results
+
+def bench_styles(count, seed):
+    """Report the style record counts of generated workbooks for each engine"""
+    from flowsheet import render_bytes
+    from style_registry import style_report
+
+    payloads = synthetic_payloads(count, seed)
+    for engine in ENGINES:
+        reports = [style_report(render_bytes(data, engine)) for data in payloads]
+        print(f"{engine:<10} cell styles max {max(r['cell_styles'] for r in reports)}, "
+              f"used max {max(r['cell_styles_used'] for r in reports)}, "
+              f"fills max {max(r['fills'] for r in reports)}, "
+              f"borders max {max(r['borders'] for r in reports)}")
+
+def _combined_run(count, seed):
+    """Child process body: stream count synthetic patients into one combined workbook"""
+    import contextlib
+    import tempfile
+
+    from combined import write_combined
+
+    rng = random.Random(seed)
+    patients = (synthetic_payload(rng, index) for index in range(count))
+    with tempfile.TemporaryDirectory() as output_dir:
+        path = os.path.join(output_dir, "combined.xlsx")
+        started = time.perf_counter()
+        with open(path, "wb") as f, contextlib.redirect_stdout(io.StringIO()):
+            write_combined(patients, f)
+        seconds = time.perf_counter() - started
+        size = os.path.getsize(path)
+    return {"patients": count, "seconds": seconds, "bytes": size, "peak_rss_mb": peak_rss_mb()}
+
+def bench_combined(counts, seed):
+    """Build combined workbooks of increasing size, each in a fresh process for a clean peak RSS"""
+    print(f"{'patients':>8} {'file MB':>8} {'build s':>8} {'ms/patient':>11} {'peak RSS MB':>12}")
+    results = []
+    for count in counts:
+        output = subprocess.run(
+            [sys.executable, __file__, "_combined-run", str(count), str(seed)],
+            check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        rss = result["peak_rss_mb"]
+        print(f"{count:>8} {result['bytes'] / 1024 / 1024:>8.2f} {result['seconds']:>8.2f} "
+              f"{result['seconds'] / count * 1000:>11.2f} {rss if rss is None else f'{rss:.1f}':>12}")
+        results.append(result)
+    return results
+
+def bench_pull_list(count, seed, budget, repeats=5):
+    """Time the ward pull list index and xlsx report, checking it against a per-patient walk"""
+    from collections import Counter
+
+    from flowsheet import resource_path
+    from pull_list import PullList
+    from schedule import layout_for, parse_schedule
+    from template_cache import load_manifest
+
+    payloads = synthetic_payloads(count, seed)
+    layout = layout_for(load_manifest(resource_path("template.xlsx")))
+
+    # The slow way: every medication of every patient, one schedule at a time
+    expected = Counter()
+    for data in payloads:
+        for medication in data["medications"]:
+            schedule = parse_schedule(medication["start_hour"], medication["frequency"], None, quiet=True)
+            for slot in layout.slots_for(*schedule) if schedule else ():
+                expected[(slot, medication["name"], medication["dosage"], data["patient"], data["chartnum"])] += 1
+
+    builds, writes = [], []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        pull_list = PullList(payloads, layout)
+        built = time.perf_counter()
+        pull_list.write_xlsx()
+        builds.append(built - started)
+        writes.append(time.perf_counter() - built)
+
+    if Counter(pull_list.entries) != expected:
+        print("Pull list does not match the per-patient schedules")
+        return False
+
+    total = statistics.median(builds) + statistics.median(writes)
+    print(f"{count} patients, {len(pull_list.entries)} doses, {len(pull_list.drugs)} drugs")
+    print(f"index build  {statistics.median(builds) * 1000:8.1f} ms")
+    print(f"xlsx report  {statistics.median(writes) * 1000:8.1f} ms")
+    print(f"total        {total * 1000:8.1f} ms (budget {budget * 1000:.0f} ms)")
+    return total <= budget
+
+def bench_watch(counts, seed, workers=None, engine=None):
+    """Drop bursts of admissions into a watched folder and time how long the watcher takes to drain them"""
+    import contextlib
+    import tempfile
+
+    from watch_folder import FolderWatcher
+
+    print(f"{'files':>6} {'drain s':>8} {'p50 ms':>8} {'p95 ms':>8} {'watcher RSS MB':>15}")
+    results = []
+    for count in counts:
+        with tempfile.TemporaryDirectory() as folder:
+            inbox, outbox = os.path.join(folder, "in"), os.path.join(folder, "out")
+            os.makedirs(inbox)
+            for index, data in enumerate(synthetic_payloads(count, seed)):
+                with open(os.path.join(inbox, f"admit-{index:04d}.json"), "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+            watcher = FolderWatcher(inbox, outbox, workers=workers, engine=engine, settle=0.2, interval=0.1)
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = watcher.run(until_idle=True)
+            seconds = time.perf_counter() - started
+        rss = peak_rss_mb()
+        print(f"{count:>6} {seconds:>8.2f} {stats['latency_ms']['p50']:>8.1f} {stats['latency_ms']['p95']:>8.1f} "
+              f"{rss if rss is None else f'{rss:.1f}':>15}")
+        results.append(dict(stats, files=count, seconds=seconds, peak_rss_mb=rss))
+    return results
+
+def bench_readback(counts, seed, workers=None, templates=5):
+    """Read back folders of completed sheets and report files/sec, records/sec and RSS"""
+    import contextlib
+    import shutil
+    import tempfile
+
+    import openpyxl
+
+    from flowsheet import render_bytes
+    from readback import extract, find_sheets
+
+    print(f"{'files':>6} {'seconds':>8} {'files/s':>8} {'records/s':>10} {'records':>9} {'RSS MB':>8}")
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        # A few distinct sheets with every highlighted slot "charted", copied out to each folder size
+        samples = []
+        for index, data in enumerate(synthetic_payloads(templates, seed)):
+            with contextlib.redirect_stdout(io.StringIO()):
+                workbook = openpyxl.load_workbook(io.BytesIO(render_bytes(data)))
+            for sheet in workbook.worksheets:
+                for row in sheet.iter_rows(min_row=6):
+                    for cell in row:
+                        if cell.fill.fill_type == "solid" and str(cell.fill.fgColor.rgb).endswith("FFFF00"):
+                            if cell.column > 3 and cell.value is None:
+                                cell.value = "AB"
+            path = os.path.join(folder, f"sample-{index}.xlsx")
+            workbook.save(path)
+            samples.append(path)
+
+        for count in counts:
+            sheets = os.path.join(folder, f"sheets-{count}")
+            os.makedirs(sheets)
+            for index in range(count):
+                shutil.copyfile(samples[index % len(samples)], os.path.join(sheets, f"{index:05d}.xlsx"))
+            output = os.path.join(folder, f"entries-{count}.csv")
+            with contextlib.redirect_stdout(io.StringIO()):
+                summary = extract(find_sheets(sheets), output, workers)
+            seconds = summary["seconds"]
+            rss = peak_rss_mb()
+            print(f"{count:>6} {seconds:>8.2f} {count / seconds:>8.1f} {summary['records'] / seconds:>10.0f} "
+                  f"{summary['records']:>9} {rss if rss is None else f'{rss:.1f}':>8}")
+            results.append(dict(summary, peak_rss_mb=rss))
+            shutil.rmtree(sheets)
+    return results
+
+def bench_formulary(count, seed, budget):
+    """Load a synthetic formulary of count drugs and time a suggestion lookup per keystroke"""
+    import csv
+    import tempfile
+
+    from formulary import Formulary
+
+    rng = random.Random(seed)
+    syllables = ["a", "ce", "pro", "mi", "zol", "ine", "fen", "ta", "cil", "lin", "dro", "xi", "cam", "pra", "zo"]
+    names = sorted({"".join(rng.choice(syllables) for _ in range(rng.randint(2, 5))).title() + f" {n}"
+                    for n in range(count)})
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "formulary.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["name", "dose", "unit", "frequency"])
+            for name in names:
+                writer.writerow([name, rng.choice(["0.1", "1", "10", "22"]), "mg/kg", rng.choice([4, 6, 8, 12, 24])])
+        started = time.perf_counter()
+        formulary = Formulary.from_csv(path)
+        load = time.perf_counter() - started
+
+    # Every prefix of a few hundred names, as a tech typing them letter by letter would ask
+    latencies = []
+    for name in rng.sample(names, min(len(names), 300)):
+        for end in range(1, len(name) + 1):
+            started = time.perf_counter()
+            formulary.suggest(name[:end])
+            latencies.append(time.perf_counter() - started)
+    p99 = percentile(latencies, 99)
+    print(f"{len(formulary)} drugs loaded in {load * 1000:.1f} ms")
+    print(f"{len(latencies)} keystrokes: p50 {percentile(latencies, 50) * 1e6:.1f} us  "
+          f"p99 {p99 * 1e6:.1f} us  max {max(latencies) * 1e6:.1f} us (budget {budget * 1e6:.0f} us)")
+    return p99 <= budget
+
+def _chained_placeholder_pass(cells, data, med_replacements, lookup):
+    """The placeholder pass as it was before substitution.py, kept as the benchmark's reference"""
+    values = {}
+    for coordinate, cell_value in cells.items():
+        if cell_value == "{cpr_dnr}":
+            values[coordinate] = data.get("cpr_dnr", "")
+        elif cell_value in med_replacements:
+            values[coordinate] = med_replacements[cell_value]
+        elif "{a}" in cell_value:
+            values[coordinate] = cell_value.replace("{a}", data.get("a", ""))
+        elif "{e}" in cell_value:
+            values[coordinate] = cell_value.replace("{e}", data.get("e", ""))
+        elif cell_value in lookup:
+            values[coordinate] = lookup[cell_value]
+        elif cell_value.startswith("{") and cell_value.endswith("}"):
+            values[coordinate] = ""
+    return values
+
+def bench_substitution(cell_count, seed, repeat=20):
+    """Per-cell cost of the placeholder pass on a synthetic template of cell_count placeholder cells"""
+    from flowsheet import resource_path
+    from sheet_plan import build_replacements
+    from substitution import compile_cells, substitute
+    from template_cache import load_manifest
+
+    manifest = load_manifest(resource_path("template.xlsx"))
+    data = synthetic_payloads(1, seed)[0]
+    lookup = build_replacements(data, manifest)
+    # The old pass looked {medN} up in a dict of its own
+    med_replacements = {token: value for token, value in lookup.items() if token.startswith("{med")}
+
+    # The real template's cells first, then copies further down the sheet until there are cell_count
+    texts = list(manifest["cells"].values())
+    cells = {}
+    for index in range(cell_count):
+        cells[f"A{index + 1}"] = texts[index % len(texts)]
+
+    # Both must agree on every cell the old chain handled correctly
+    if (_chained_placeholder_pass(manifest["cells"], data, med_replacements, lookup)
+            != substitute(compile_cells(manifest["cells"]), lookup)):
+        print("Substitution does not match the old placeholder pass on the template")
+        return False
+
+    started = time.perf_counter()
+    compiled = compile_cells(cells)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    def per_cell(run):
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - started)
+        return min(times) / cell_count * 1e9
+
+    chained = per_cell(lambda: _chained_placeholder_pass(cells, data, med_replacements, lookup))
+    single = per_cell(lambda: substitute(compiled, lookup))
+    print(f"{cell_count} cells, compiled once in {compile_ms:.1f} ms")
+    print(f"chained checks  {chained:8.1f} ns/cell")
+    print(f"single pass     {single:8.1f} ns/cell ({chained / single:.1f}x)")
+    return True
+
+def _timed(label, payloads, run, measure_memory=True):
+    """Time run(data) for every payload, then repeat once under tracemalloc for peak memory"""
+    import contextlib
+    import tracemalloc
+
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        for data in payloads:
+            call_started = time.perf_counter()
+            run(data)
+            latencies.append(time.perf_counter() - call_started)
+        elapsed = time.perf_counter() - started
+
+        peak_kb = None
+        if measure_memory:
+            tracemalloc.start()
+            for data in payloads[:min(len(payloads), 20)]:
+                run(data)
+            peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+
+    result = {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "per_sec": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "peak_kb": peak_kb
+    }
+    print(f"{label:<18} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+          f"{result['per_sec']:8.1f}/sec  peak {peak_kb or 0:8.0f} KB")
+    return result
+
+def run_suite(count, seed, engine=None):
+    """Benchmark highlighting, the placeholder pass and the full fill_template path"""
+    import tempfile
+    from unittest import mock
+
+    import openpyxl
+
+    import app
+    from sheet_plan import build_replacements, plan_highlights
+    from style_registry import apply_fill
+    from substitution import compile_cells, substitute
+    from template_cache import load_manifest
+
+    payloads = synthetic_payloads(count, seed)
+    template_path = app.resource_path("template.xlsx")
+    manifest = load_manifest(template_path)
+    sheet = openpyxl.load_workbook(template_path)[manifest["sheet"]]
+
+    def highlight(data):
+        # What render_workbook does for highlights: plan the slots, then apply the interned fills
+        for coordinate, role in plan_highlights(data, manifest).items():
+            apply_fill(sheet[coordinate], role)
+
+    def placeholders(data):
+        # The same steps as plan_sheet's placeholder pass, without its highlighting
+        key = manifest["template_hash"]
+        substitute(compile_cells(manifest["cells"], key), build_replacements(data, manifest), key)
+
+    results = {"highlighting": _timed("highlighting", payloads, highlight),
+               "placeholder_pass": _timed("placeholder_pass", payloads, placeholders)}
+
+    # Full path with the save dialog answered and the spreadsheet launcher stubbed out
+    with tempfile.TemporaryDirectory() as output_dir:
+        output_path = os.path.join(output_dir, "bench.xlsx")
+        with mock.patch("tkinter.filedialog.asksaveasfilename", return_value=output_path), \
+                mock.patch.object(app, "open_file"):
+            results["fill_template"] = _timed(
+                "fill_template", payloads, lambda data: app.fill_template(data, engine))
+
+    return {
+        "meta": {
+            "sheets": count,
+            "seed": seed,
+            "engine": engine or os.environ.get("FLOWSHEET_ENGINE", "openpyxl"),
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "peak_rss_mb": peak_rss_mb()
+        },
+        "benchmarks": results
+    }
+
+REGRESSION_METRICS = ("p50_ms", "p95_ms", "peak_kb")
+
+def compare_results(current, baseline, threshold):
+    """List the metrics that got worse than baseline by more than threshold (a fraction)"""
+    regressions = []
+    for name, base in baseline.get("benchmarks", {}).items():
+        now = current["benchmarks"].get(name)
+        if now is None:
+            continue
+        for metric in REGRESSION_METRICS:
+            if not base.get(metric) or now.get(metric) is None:
+                continue
+            change = now[metric] / base[metric] - 1
+            if change > threshold:
+                regressions.append(f"{name}.{metric}: {base[metric]:.2f} -> {now[metric]:.2f} ({change:+.0%})")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flow sheet benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    engines = commands.add_parser("engines", help="Compare the openpyxl and xlsxpatch renderers")
+    engines.add_argument("-n", "--sheets", type=int, default=50)
+    engines.add_argument("--seed", type=int, default=0)
+    engines.add_argument("--no-check", action="store_true", help="Skip the cell-by-cell equivalence check")
+
+    styles = commands.add_parser("styles", help="Report style record counts per generated workbook")
+    styles.add_argument("-n", "--sheets", type=int, default=20)
+    styles.add_argument("--seed", type=int, default=0)
+
+    suite = commands.add_parser("suite", help="Time highlighting, the placeholder pass and fill_template")
+    suite.add_argument("-n", "--sheets", type=int, default=100)
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--engine", choices=ENGINES, default=None)
+    suite.add_argument("-o", "--output", default="bench_results.json", help="Where to write the JSON results")
+    suite.add_argument("--baseline", help="Results file to compare against")
+    suite.add_argument("--threshold", type=float, default=0.2,
+                       help="Allowed slowdown before failing, as a fraction (default 0.2)")
+
+    pull = commands.add_parser("pull-list", help="Time the ward pharmacy pull list and report")
+    pull.add_argument("-n", "--patients", type=int, default=300)
+    pull.add_argument("--seed", type=int, default=0)
+    pull.add_argument("--budget", type=float, default=0.5, help="Seconds allowed for index plus report")
+
+    combined = commands.add_parser("combined", help="Build multi-patient workbooks and report size, time and RSS")
+    combined.add_argument("-n", "--patients", type=int, nargs="+", default=[10, 100, 500])
+    combined.add_argument("--seed", type=int, default=0)
+
+    watch = commands.add_parser("watch", help="Time the watch-folder pipeline draining bursts of admissions")
+    watch.add_argument("-n", "--files", type=int, nargs="+", default=[100])
+    watch.add_argument("-j", "--workers", type=int, default=None)
+    watch.add_argument("--engine", choices=ENGINES, default=None)
+    watch.add_argument("--seed", type=int, default=0)
+
+    readback = commands.add_parser("readback", help="Time reading completed sheets back into a dataset")
+    readback.add_argument("-n", "--files", type=int, nargs="+", default=[200, 1000])
+    readback.add_argument("-j", "--workers", type=int, default=None)
+    readback.add_argument("--seed", type=int, default=0)
+
+    formulary = commands.add_parser("formulary", help="Time formulary loading and per-keystroke suggestions")
+    formulary.add_argument("-n", "--drugs", type=int, default=5000)
+    formulary.add_argument("--seed", type=int, default=0)
+    formulary.add_argument("--budget", type=float, default=0.001, help="Seconds allowed per keystroke at p99")
+
+    substitution = commands.add_parser("substitution", help="Per-cell cost of the placeholder pass")
+    substitution.add_argument("-n", "--cells", type=int, default=50000)
+    substitution.add_argument("--seed", type=int, default=0)
+
+    combined_run = commands.add_parser("_combined-run")
+    combined_run.add_argument("count", type=int)
+    combined_run.add_argument("seed", type=int)
+
+    engine_run = commands.add_parser("_engine-run")
+    engine_run.add_argument("engine", choices=ENGINES)
+    engine_run.add_argument("count", type=int)
+    engine_run.add_argument("seed", type=int)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "_engine-run":
+        print(json.dumps(_engine_run(args.engine, args.count, args.seed)))
+        return 0
+
+    if args.command == "_combined-run":
+        print(json.dumps(_combined_run(args.count, args.seed)))
+        return 0
+
+    if args.command == "engines":
+        # A few patients past the template's capacity exercise the continuation sheets too
+        payloads = synthetic_payloads(args.sheets, args.seed) + synthetic_payloads(
+            5, args.seed + 1, max_medications=30, max_procedures=14)
+        if not args.no_check and not check_engines(payloads):
+            return 1
+        bench_engines(args.sheets, args.seed)
+    elif args.command == "suite":
+        results = run_suite(args.sheets, args.seed, args.engine)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+        if args.baseline:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+            regressions = compare_results(results, baseline, args.threshold)
+            for regression in regressions:
+                print(f"Regression: {regression}")
+            if regressions:
+                return 1
+            print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    elif args.command == "styles":
+        bench_styles(args.sheets, args.seed)
+    elif args.command == "combined":
+        bench_combined(args.patients, args.seed)
+    elif args.command == "watch":
+        bench_watch(args.files, args.seed, args.workers, args.engine)
+    elif args.command == "readback":
+        bench_readback(args.files, args.seed, args.workers)
+    elif args.command == "formulary":
+        if not bench_formulary(args.drugs, args.seed, args.budget):
+            return 1
+    elif args.command == "substitution":
+        if not bench_substitution(args.cells, args.seed):
+            return 1
+    elif args.command == "pull-list":
+        if not bench_pull_list(args.patients, args.seed, args.budget):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,26 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+import os
+import sys
+
 block_cipher = None
 
+# Compile the template manifest before bundling so it ships next to template.xlsx;
+# without it the onefile build would rebuild the manifest on every launch
+sys.path.insert(0, SPECPATH)
+from template_cache import load_manifest
+load_manifest(os.path.join(SPECPATH, 'template.xlsx'))
+
 a = Analysis(
     ['app.py'],
     pathex=[],
     binaries=[],
     datas=[
         ('template.xlsx', '.'),
+        ('template.manifest.json', '.'),
         ('icon.ico', '.'),
+        ('icon32.png', '.'),
+        ('formulary.csv', '.'),
     ],
     hiddenimports=['PIL._tkinter_finder'],
     hookspath=[],
@@ -0,0 +1,218 @@
+# One workbook with a flow sheet tab per patient. Built on the xlsxpatch engine:
+# every tab is the template sheet patched with that patient's plan, and all
+# tabs share one shared-strings table and one style table. Each tab is written
+# into the zip as soon as it is rendered, so memory stays flat however many
+# patients there are; only the (deduplicated) strings and styles grow.
+# write_tabs is the same writer for any list of titled sheets; xlsx_patch uses
+# it for the continuation pages of a single patient's sheet.
+import argparse
+import os
+import posixpath
+import re
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+from flowsheet import ZIP_DATE_TIME, resource_path
+from instrumentation import run as trace_run, span
+from sheet_plan import MAX_TITLE, page_title, paginate, plan_sheet
+from template_cache import load_manifest
+from xlsx_patch import _StyleTable, _attributes, _load_template, _sheet_xml
+
+INVALID_TITLE_RE = re.compile(r"[\[\]:*?/\\]")
+WORKSHEET_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"
+WORKSHEET_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+ATTRIBUTE_ENTITIES = {'"': "&quot;"}
+
+def tab_title(data, number, used, page=1):
+    """A unique, Excel-safe tab name from the patient name, chart number and page"""
+    parts = [data.get("patient", "").strip(), data.get("chartnum", "").strip()]
+    title = INVALID_TITLE_RE.sub("", " ".join(part for part in parts if part)).strip("' ")
+    title = page_title(title[:MAX_TITLE] or f"Patient {number}", page)
+    candidate = title
+    suffix = 2
+    while candidate.lower() in used:
+        tail = f" ({suffix})"
+        candidate = title[:MAX_TITLE - len(tail)] + tail
+        suffix += 1
+    used.add(candidate.lower())
+    return candidate
+
+def _entry(name, date_time=ZIP_DATE_TIME):
+    info = zipfile.ZipInfo(name, date_time)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o600 << 16
+    return info
+
+def _rels_path(part):
+    return posixpath.join(posixpath.dirname(part), "_rels", posixpath.basename(part) + ".rels")
+
+def write_combined(patients, stream=None, template_path=None):
+    """Render every payload in patients (any iterable) as its own tab of one workbook.
+
+    Patients with more medications or procedures than the template holds get
+    their continuation pages as the tabs right after their own. A patient
+    whose payload cannot be planned is reported and left out. Returns the
+    xlsx bytes, or writes them to stream and returns None.
+    """
+    import io
+
+    template_path = template_path or resource_path("template.xlsx")
+    output = stream if stream is not None else io.BytesIO()
+    counted = {"patients": 0, "skipped": 0}
+
+    def tabs(manifest):
+        used = set()
+        for number, data in enumerate(patients, start=1):
+            counted["patients"] = number
+            # Every page is planned before any is written, so a bad payload costs only its own tabs
+            try:
+                plans = [plan_sheet(page_data, manifest) for page_data in paginate(data, manifest)]
+            except Exception as e:
+                print(f"Patient {number}: skipped ({e})")
+                counted["skipped"] += 1
+                continue
+            for page, plan in enumerate(plans, start=1):
+                yield tab_title(data, number, used, page), plan
+
+    with trace_run("combined"):
+        titles = write_tabs(tabs(load_manifest(template_path)), output, template_path)
+
+    print(f"Combined {counted['patients'] - counted['skipped']} patient(s) on {len(titles)} tab(s), "
+          f"{counted['skipped']} skipped")
+    if stream is None:
+        return output.getvalue()
+    return None
+
+def write_tabs(sheets, stream, template_path):
+    """Write (title, plan) pairs, from any iterable, as the tabs of one workbook.
+
+    Each plan is plan_sheet's (values, fills) for that tab's payload; titles
+    must already be unique and Excel-safe. Returns the list of titles written.
+    """
+    with span("template_load"):
+        manifest = load_manifest(template_path)
+        template = _load_template(template_path, manifest)
+    parts = {info.filename: content for info, content in template.entries}
+    sheet_rels_part = _rels_path(template.sheet_part)
+    sheet_rels = parts.get(sheet_rels_part)
+
+    # Only the first tab is selected when the workbook opens
+    other_head = template.sheet_head.replace(' tabSelected="1"', "")
+    styled = _StyleTable(template)
+    tabs = []
+
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as archive:
+        with span("sheets"):
+            for number, (title, (values, fills)) in enumerate(sheets, start=1):
+                sheet_xml = _sheet_xml(template, values, fills, styled)
+                if number > 1:
+                    sheet_xml = other_head + sheet_xml[len(template.sheet_head):]
+                # Next to the template sheet, so its relative relationship targets still resolve
+                part = posixpath.join(posixpath.dirname(template.sheet_part), f"patient{number}.xml")
+                archive.writestr(_entry(part), sheet_xml)
+                if sheet_rels is not None:
+                    # Tabs share the template's printer settings and other sheet-level parts
+                    archive.writestr(_entry(_rels_path(part)), sheet_rels)
+                tabs.append((title, part))
+
+        if not tabs:
+            raise ValueError("No sheets to write")
+
+        with span("workbook_parts"):
+            replaced = {
+                template.strings_part: styled.sst_xml(),
+                template.styles_part: styled.styles_xml(),
+                "xl/workbook.xml": _workbook_xml(parts["xl/workbook.xml"].decode("utf-8"), manifest, tabs),
+                "xl/_rels/workbook.xml.rels": _workbook_rels(
+                    parts["xl/_rels/workbook.xml.rels"].decode("utf-8"), template.sheet_part, tabs),
+                "[Content_Types].xml": _content_types(
+                    parts["[Content_Types].xml"].decode("utf-8"), template.sheet_part, tabs)
+            }
+            if "docProps/app.xml" in parts:
+                replaced["docProps/app.xml"] = _app_xml(parts["docProps/app.xml"].decode("utf-8"), tabs)
+
+            for info, content in template.entries:
+                if info.filename in (template.sheet_part, sheet_rels_part):
+                    continue
+                entry = zipfile.ZipInfo(info.filename, info.date_time)
+                entry.compress_type = info.compress_type
+                entry.external_attr = info.external_attr
+                archive.writestr(entry, replaced.get(info.filename, content))
+
+    return [title for title, _ in tabs]
+
+def _rel_id(number):
+    return f"rIdPatient{number}"
+
+def _workbook_xml(workbook_xml, manifest, tabs):
+    sheets = re.findall(r"<sheet\b[^>]*/>", workbook_xml)
+    next_id = max(int(_attributes(sheet)["sheetId"]) for sheet in sheets) + 1
+    patient_sheets = "".join(
+        f'<sheet name="{escape(title, ATTRIBUTE_ENTITIES)}" sheetId="{next_id + number}" r:id="{_rel_id(number)}"/>'
+        for number, (title, _) in enumerate(tabs, start=1))
+    for sheet in sheets:
+        if _attributes(sheet).get("name") == manifest["sheet"]:
+            return workbook_xml.replace(sheet, patient_sheets, 1)
+    raise ValueError(f"Sheet '{manifest['sheet']}' not found in template workbook")
+
+def _workbook_rels(rels_xml, sheet_part, tabs):
+    target = posixpath.relpath(sheet_part, "xl")
+    rels = re.findall(r"<Relationship\b[^>]*/>", rels_xml)
+    for rel in rels:
+        attrs = _attributes(rel)
+        if attrs["Type"] == WORKSHEET_TYPE and attrs["Target"].lstrip("/").replace("xl/", "", 1) == target:
+            patient_rels = "".join(
+                f'<Relationship Id="{_rel_id(number)}" Type="{WORKSHEET_TYPE}" Target="{posixpath.relpath(part, "xl")}"/>'
+                for number, (_, part) in enumerate(tabs, start=1))
+            return rels_xml.replace(rel, patient_rels, 1)
+    raise ValueError("Template workbook has no relationship to the flow sheet")
+
+def _content_types(types_xml, sheet_part, tabs):
+    overrides = "".join(f'<Override PartName="/{part}" ContentType="{WORKSHEET_CONTENT_TYPE}"/>' for _, part in tabs)
+    original = re.search(rf'<Override PartName="/{re.escape(sheet_part)}"[^>]*/>', types_xml)
+    if original:
+        return types_xml.replace(original.group(0), overrides, 1)
+    return types_xml.replace("</Types>", overrides + "</Types>", 1)
+
+def _app_xml(app_xml, tabs):
+    """Keep Excel's document properties in step with the new tab list"""
+    titles = "".join(f"<vt:lpstr>{escape(title)}</vt:lpstr>" for title, _ in tabs)
+    app_xml = re.sub(r"<TitlesOfParts>.*?</TitlesOfParts>",
+                     f'<TitlesOfParts><vt:vector size="{len(tabs)}" baseType="lpstr">{titles}</vt:vector></TitlesOfParts>',
+                     app_xml, count=1, flags=re.S)
+    return re.sub(r"(<vt:lpstr>Worksheets</vt:lpstr></vt:variant><vt:variant><vt:i4>)\d+",
+                  rf"\g<1>{len(tabs)}", app_xml, count=1)
+
+def main(argv=None):
+    from batch import load_records
+
+    parser = argparse.ArgumentParser(prog="app.py combined",
+                                     description="Render a ward file as one workbook with a tab per patient")
+    parser.add_argument("input", help="JSONL or CSV file, one patient payload per record")
+    parser.add_argument("-o", "--output", default="combined-flow-sheets.xlsx", help="Workbook to write")
+    args = parser.parse_args(argv)
+
+    def patients():
+        for number, data, error in load_records(args.input):
+            if error:
+                print(f"Record {number}: skipped ({error})")
+            else:
+                yield data
+
+    started = time.perf_counter()
+    # Written beside the output and moved into place only once complete, so a failed run leaves no broken workbook
+    temp_path = f"{args.output}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            write_combined(patients(), f)
+        os.replace(temp_path, args.output)
+    except Exception as e:
+        print(f"Could not write {args.output}: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return 1
+    print(f"Written to {args.output} in {time.perf_counter() - started:.2f}s")
+    return 0
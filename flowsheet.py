@@ -0,0 +1,169 @@
+"""Render flow sheets without the desktop GUI.
+
+Nothing here imports tkinter, PIL or appgui, and openpyxl is only imported
+when the openpyxl engine actually renders, so batch jobs, the render service
+and other scripts can use this module without a display.
+"""
+import io
+import os
+import re
+import sys
+import zipfile
+from datetime import datetime
+
+from instrumentation import run as trace_run, span
+from schedule import TimeLayout, parse_schedule, scheduled_cells
+from sheet_plan import page_title, paginate, plan_sheet
+from style_registry import apply_fill
+from template_cache import load_manifest
+
+ENGINES = ("openpyxl", "xlsxpatch")
+# Every zip entry gets this timestamp so identical input renders identical bytes
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+# Path separators, characters Windows reserves in file names, and control characters
+UNSAFE_FILENAME_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+# Template bytes by template hash, so repeated openpyxl renders skip the disk read
+_template_bytes = {}
+
+def resource_path(relative_path):
+    """Get absolute path to resource for PyInstaller"""
+    try:
+        # PyInstaller creates a temp folder and stores path in _MEIPASS
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+    
+    return os.path.join(base_path, relative_path)
+
+def is_valid_hour(value):
+    """Helper function to validate hour values"""
+    try:
+        hour = int(str(value))
+        return 1 <= hour <= 12
+    except (ValueError, TypeError):
+        return False
+
+def highlight_cells(sheet, start_hour, frequency, row, is_medication=False, has_merged_pair=False, layout=None):
+    schedule = parse_schedule(start_hour, frequency, row)
+    if schedule is None:
+        return
+
+    # Without a precomputed layout, fall back to reading row 5 of this sheet
+    if layout is None:
+        layout = TimeLayout.from_sheet(sheet)
+
+    cells = scheduled_cells(layout, schedule[0], schedule[1], row, two_rows=has_merged_pair or is_medication)
+    # The same interned style path the renderer uses for its planned fills
+    for coordinate in cells:
+        apply_fill(sheet[coordinate], "highlight")
+
+def render_workbook(data):
+    """Fill the template with patient data and return the openpyxl workbook.
+
+    A patient with more medications or procedures than the template holds gets
+    continuation sheets, copied from the untouched template sheet.
+    """
+    print("Starting to process the template...")
+    template_path = resource_path("template.xlsx")
+    if not os.path.exists(template_path):
+        raise FileNotFoundError(f"Template file '{template_path}' not found.")
+
+    import openpyxl
+
+    with span("template_load"):
+        manifest = load_manifest(template_path)
+        content = _template_bytes.get(manifest["template_hash"])
+        if content is None:
+            with open(template_path, "rb") as f:
+                content = _template_bytes[manifest["template_hash"]] = f.read()
+        workbook = openpyxl.load_workbook(io.BytesIO(content))
+        template_sheet = workbook[manifest["sheet"]]
+
+    pages = paginate(data, manifest)
+    sheets = [template_sheet]
+    for page in range(2, len(pages) + 1):
+        sheet = workbook.copy_worksheet(template_sheet)
+        sheet.title = page_title(template_sheet.title, page)
+        sheet.sheet_view.tabSelected = False
+        sheets.append(sheet)
+
+    for sheet, page_data in zip(sheets, pages):
+        values, fills = plan_sheet(page_data, manifest)
+
+        with span("apply_cells"):
+            for coordinate, value in values.items():
+                sheet[coordinate].value = value
+
+            # Apply CPR/DNR and every treatment and medication highlight in one batched pass
+            for coordinate, role in fills.items():
+                apply_fill(sheet[coordinate], role)
+
+    return workbook
+
+class _StableZipFile(zipfile.ZipFile):
+    """A ZipFile that stamps entries with ZIP_DATE_TIME instead of the current time"""
+
+    def writestr(self, zinfo_or_arcname, data, compress_type=None, compresslevel=None):
+        if not isinstance(zinfo_or_arcname, zipfile.ZipInfo):
+            zinfo = zipfile.ZipInfo(zinfo_or_arcname, ZIP_DATE_TIME)
+            zinfo.compress_type = self.compression
+            zinfo.external_attr = 0o600 << 16
+            zinfo_or_arcname = zinfo
+        super().writestr(zinfo_or_arcname, data, compress_type, compresslevel)
+
+    def write(self, filename, arcname=None, compress_type=None, compresslevel=None):
+        # openpyxl streams worksheets through temp files, which would carry their mtime
+        with open(filename, "rb") as f:
+            self.writestr(arcname or os.path.basename(filename), f.read(), compress_type, compresslevel)
+
+def save_workbook(workbook, stream):
+    """Save an openpyxl workbook byte-for-byte reproducibly.
+
+    openpyxl's own save stamps the current time into docProps/core.xml and
+    every zip entry; this keeps the template's created/modified properties
+    and uses ZIP_DATE_TIME instead.
+    """
+    from openpyxl.writer.excel import ExcelWriter
+
+    archive = _StableZipFile(stream, "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+    ExcelWriter(workbook, archive).save()
+
+def render(data, stream=None, engine=None):
+    """Render one flow sheet from a collect_data() dict.
+
+    Returns the xlsx bytes, or writes them to stream (any writable binary
+    file object, seekable or not) and returns None.
+    """
+    engine = engine or os.environ.get("FLOWSHEET_ENGINE", "openpyxl")
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown rendering engine '{engine}'")
+
+    with trace_run("render", engine=engine):
+        if engine == "xlsxpatch":
+            from xlsx_patch import render_xlsx
+            print("Starting to process the template...")
+            return render_xlsx(data, resource_path("template.xlsx"), stream)
+
+        workbook = render_workbook(data)
+        with span("workbook_save"):
+            output = stream if stream is not None else io.BytesIO()
+            save_workbook(workbook, output)
+        if stream is None:
+            return output.getvalue()
+        return None
+
+def render_bytes(data, engine=None):
+    """Render a flow sheet to xlsx bytes with the chosen engine"""
+    return render(data, engine=engine)
+
+def safe_filename(text):
+    """text with anything that cannot go in a file name replaced by "_" """
+    return UNSAFE_FILENAME_RE.sub("_", text).strip(" .")
+
+def default_filename(data):
+    """Build the {date}-{patient}-Flow-Chart.xlsx name used for saved sheets"""
+    patient_name = data.get("patient", "").strip()
+    if patient_name.startswith("Enter "): patient_name = ""
+    patient_name = safe_filename(patient_name)
+    today = datetime.now().strftime("%Y.%m.%d")
+    return f"{today}-{patient_name}-Flow-Chart.xlsx"
@@ -0,0 +1,83 @@
+# Medication formulary for the name autocomplete: drugs with a default dose,
+# unit and frequency, kept sorted by lower-cased name so every prefix lookup
+# is a bisect into one list.
+import csv
+import os
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+
+# A formulary in ~/.flowsheet replaces the sample one shipped with the app. The
+# sample has drug names only: doses and frequencies, which picking a drug fills
+# in, must come from the site's own vetted list.
+USER_FORMULARY = os.path.join(os.path.expanduser("~"), ".flowsheet", "formulary.csv")
+SUGGESTION_LIMIT = 8
+
+def default_path():
+    """FLOWSHEET_FORMULARY, else ~/.flowsheet/formulary.csv if present, else the bundled sample"""
+    path = os.environ.get("FLOWSHEET_FORMULARY")
+    if path:
+        return path
+    if os.path.exists(USER_FORMULARY):
+        return USER_FORMULARY
+    from flowsheet import resource_path
+    return resource_path("formulary.csv")
+
+def dosage_text(drug):
+    """What goes in the form's Dosage entry, e.g. "0.2 mg/kg" """
+    return f"{drug['dose']} {drug['unit']}".strip()
+
+class Formulary:
+    """Drugs sorted by name; suggest() finds the ones starting with what has been typed"""
+
+    def __init__(self, drugs):
+        drugs = [drug for drug in drugs if drug["name"]]
+        drugs.sort(key=lambda drug: drug["name"].lower())
+        self.drugs = drugs
+        self.keys = [drug["name"].lower() for drug in drugs]
+
+    @classmethod
+    def from_csv(cls, path):
+        """Read name, dose, unit and frequency columns; missing ones are empty, other columns are ignored"""
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            drugs = [{field: (row.get(field) or "").strip() for field in ("name", "dose", "unit", "frequency")}
+                     for row in csv.DictReader(f)]
+        return cls(drugs)
+
+    def __len__(self):
+        return len(self.drugs)
+
+    def suggest(self, text, limit=SUGGESTION_LIMIT):
+        """Up to limit drugs whose name starts with text, ignoring case, in name order"""
+        prefix = text.strip().lower()
+        if not prefix:
+            return []
+        matches = []
+        index = bisect_left(self.keys, prefix)
+        while index < len(self.keys) and len(matches) < limit and self.keys[index].startswith(prefix):
+            matches.append(self.drugs[index])
+            index += 1
+        return matches
+
+class BackgroundFormulary:
+    """Loads the formulary on a worker thread the first time it is asked for.
+
+    get() returns a Future for the Formulary, so creating this costs nothing
+    at startup and the Tk thread never waits on the file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.future = None
+
+    def get(self):
+        if self.future is None:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="formulary")
+            self.future = executor.submit(self._load)
+            executor.shutdown(wait=False)
+        return self.future
+
+    def _load(self):
+        path = self.path or default_path()
+        formulary = Formulary.from_csv(path)
+        print(f"Loaded {len(formulary)} drugs from {path}")
+        return formulary
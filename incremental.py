@@ -0,0 +1,206 @@
+import argparse
+import copy
+import io
+import json
+
+from instrumentation import run as trace_run, span
+from sheet_plan import paginate, plan_sheet
+from style_registry import apply_fill
+from template_cache import load_manifest
+
+_template_fills = {}
+
+class SheetDiff:
+    """The cell values and fills that differ between the sheets for two payloads"""
+
+    def __init__(self, old_data, new_data, manifest):
+        self.old_data = old_data
+        self.new_data = new_data
+        old_values, old_fills = plan_sheet(old_data, manifest)
+        new_values, new_fills = plan_sheet(new_data, manifest)
+        self.planned_fills = new_fills
+
+        # Only placeholder cells ever carry planned values, so hourly cells never appear here
+        self.values = {}
+        for coordinate in set(old_values) | set(new_values):
+            before = old_values.get(coordinate, "")
+            after = new_values.get(coordinate, "")
+            if before != after:
+                self.values[coordinate] = (before, after)
+
+        # coordinate -> (old role or None, new role or None)
+        self.fills = {}
+        for coordinate in set(old_fills) | set(new_fills):
+            before = old_fills.get(coordinate)
+            after = new_fills.get(coordinate)
+            if before != after:
+                self.fills[coordinate] = (before, after)
+
+    def __bool__(self):
+        return bool(self.values or self.fills)
+
+    def field_changes(self):
+        """Payload-level changes in plain words, for the audit summary"""
+        old, new = self.old_data, self.new_data
+        changes = []
+        for key in new.keys() | old.keys():
+            if key in ("procedures", "treatments", "medications"):
+                continue
+            if old.get(key, "") != new.get(key, ""):
+                changes.append(f"{key}: {old.get(key, '')!r} -> {new.get(key, '')!r}")
+
+        old_meds, new_meds = old.get("medications", []), new.get("medications", [])
+        for i in range(max(len(old_meds), len(new_meds))):
+            before = old_meds[i] if i < len(old_meds) else None
+            after = new_meds[i] if i < len(new_meds) else None
+            if before == after:
+                continue
+            if before is None:
+                changes.append(f"medication {i + 1} added: {_describe(after)}")
+            elif after is None:
+                changes.append(f"medication {i + 1} removed: {_describe(before)}")
+            else:
+                changes.append(f"medication {i + 1}: {_describe(before)} -> {_describe(after)}")
+
+        old_treatments, new_treatments = old.get("treatments", {}), new.get("treatments", {})
+        for name in sorted(old_treatments.keys() | new_treatments.keys()):
+            before, after = old_treatments.get(name, {}), new_treatments.get(name, {})
+            if before != after:
+                changes.append(f"treatment {name}: {_describe(before)} -> {_describe(after)}")
+
+        if old.get("procedures", []) != new.get("procedures", []):
+            changes.append(f"procedures: {len(old.get('procedures', []))} -> {len(new.get('procedures', []))} entries")
+        return sorted(changes)
+
+    def summary(self):
+        lines = self.field_changes()
+        lines.append(f"{len(self.values)} cell value(s), {sum(1 for _, after in self.fills.values() if after)} "
+                     f"highlight(s) added or changed, {sum(1 for _, after in self.fills.values() if not after)} removed")
+        return lines
+
+def _describe(entry):
+    label = f"{entry.get('name', '')} {entry.get('dosage', '')}".strip()
+    start_hour, frequency = entry.get("start_hour", ""), entry.get("frequency", "")
+    schedule = f"start {start_hour} every {frequency}" if start_hour or frequency else "no schedule"
+    return f"{label} ({schedule})" if label else schedule
+
+def template_fills(template_path, manifest):
+    """The template's own fill for every cell that has one, to restore removed highlights"""
+    fills = _template_fills.get(manifest["template_hash"])
+    if fills is None:
+        import openpyxl
+
+        # read_only keeps the styles of merged cells that a normal load drops
+        workbook = openpyxl.load_workbook(template_path, read_only=True)
+        fills = {}
+        try:
+            for row in workbook[manifest["sheet"]].iter_rows():
+                for cell in row:
+                    if getattr(cell, "fill", None) is not None and cell.fill.fill_type:
+                        fills[cell.coordinate] = copy.copy(cell.fill)
+        finally:
+            workbook.close()
+        _template_fills[manifest["template_hash"]] = fills
+    return fills
+
+def apply_diff(sheet, diff, original_fills):
+    """Write only the changed cells; returns the coordinates skipped because they were edited by hand"""
+    from openpyxl.cell.cell import MergedCell
+    from openpyxl.styles import PatternFill
+
+    skipped = []
+    for coordinate, (before, after) in sorted(diff.values.items()):
+        cell = sheet[coordinate]
+        current = "" if cell.value is None else cell.value
+        if current != before:
+            # Someone typed over the generated value; theirs wins
+            skipped.append(coordinate)
+            continue
+        cell.value = after
+
+    for coordinate, (_, after) in sorted(diff.fills.items()):
+        if after:
+            apply_fill(sheet[coordinate], after)
+        else:
+            sheet[coordinate].fill = copy.copy(original_fills.get(coordinate, PatternFill()))
+
+    # openpyxl drops the styles of merged cells below the first when loading,
+    # so unchanged highlights there have to be put back
+    for coordinate, role in diff.planned_fills.items():
+        if coordinate not in diff.fills and isinstance(sheet[coordinate], MergedCell):
+            apply_fill(sheet[coordinate], role)
+    return skipped
+
+def update_sheet(source, old_data, new_data, stream=None):
+    """Bring an already generated flow sheet from old_data to new_data.
+
+    source is a path or binary file of the generated sheet. Only cells whose
+    planned value or fill changed are touched; anything techs typed into the
+    hourly cells is kept. Returns (xlsx bytes or None when stream is given,
+    SheetDiff, skipped coordinates). Sheets with continuation pages cannot
+    be updated in place and raise ValueError; regenerate those.
+    """
+    from flowsheet import resource_path, save_workbook
+
+    template_path = resource_path("template.xlsx")
+    with trace_run("update"):
+        manifest = load_manifest(template_path)
+        for data in (old_data, new_data):
+            if len(paginate(data, manifest)) > 1:
+                raise ValueError("The orders need continuation pages; regenerate the sheet instead of updating it")
+        with span("diff"):
+            diff = SheetDiff(old_data, new_data, manifest)
+
+        import openpyxl
+
+        with span("workbook_load"):
+            workbook = openpyxl.load_workbook(source)
+            sheet = workbook[manifest["sheet"]]
+        with span("apply_cells"):
+            skipped = apply_diff(sheet, diff, template_fills(template_path, manifest))
+        with span("workbook_save"):
+            output = stream if stream is not None else io.BytesIO()
+            save_workbook(workbook, output)
+
+    if stream is None:
+        return output.getvalue(), diff, skipped
+    return None, diff, skipped
+
+def main(argv=None):
+    from batch import normalize_payload
+
+    parser = argparse.ArgumentParser(prog="app.py update",
+                                     description="Apply order changes to an already generated flow sheet")
+    parser.add_argument("sheet", help="Generated .xlsx flow sheet")
+    parser.add_argument("old", help="JSON payload the sheet was generated from")
+    parser.add_argument("new", help="JSON payload with the current orders")
+    parser.add_argument("-o", "--output", default=None, help="Where to save (default: overwrite the sheet)")
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would change")
+    args = parser.parse_args(argv)
+
+    payloads = []
+    for path in (args.old, args.new):
+        with open(path, encoding="utf-8") as f:
+            payloads.append(normalize_payload(json.load(f)))
+
+    if args.dry_run:
+        from flowsheet import resource_path
+
+        diff = SheetDiff(payloads[0], payloads[1], load_manifest(resource_path("template.xlsx")))
+        for line in diff.summary():
+            print(line)
+        return 0
+
+    try:
+        content, diff, skipped = update_sheet(args.sheet, payloads[0], payloads[1])
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    for line in diff.summary():
+        print(line)
+    for coordinate in skipped:
+        print(f"Left {coordinate} as is: it was edited after the sheet was generated")
+    with open(args.output or args.sheet, "wb") as f:
+        f.write(content)
+    print(f"Updated sheet saved to {args.output or args.sheet}")
+    return 0
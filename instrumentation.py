@@ -0,0 +1,174 @@
+import argparse
+import contextlib
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+# Tracing is off unless FLOWSHEET_TRACE=1; FLOWSHEET_TRACE_MEMORY=1 adds tracemalloc peaks
+ENABLED = os.environ.get("FLOWSHEET_TRACE") == "1"
+TRACE_MEMORY = os.environ.get("FLOWSHEET_TRACE_MEMORY") == "1"
+LOG_PATH = os.environ.get("FLOWSHEET_TRACE_LOG") or os.path.join(os.path.expanduser("~"), ".flowsheet", "trace.jsonl")
+MAX_LOG_BYTES = 1024 * 1024
+LOG_BACKUPS = 5
+
+_local = threading.local()
+_logger = None
+_logger_lock = threading.Lock()
+_NOOP = contextlib.nullcontext()
+
+def configure(enabled=True, memory=False, log_path=None):
+    """Turn tracing on or off at runtime"""
+    global ENABLED, TRACE_MEMORY, LOG_PATH
+    ENABLED = enabled
+    TRACE_MEMORY = memory
+    if log_path:
+        LOG_PATH = log_path
+
+def _get_logger():
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            os.makedirs(os.path.dirname(LOG_PATH) or ".", exist_ok=True)
+            logger = logging.getLogger("flowsheet.trace")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            handler = RotatingFileHandler(LOG_PATH, maxBytes=MAX_LOG_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            _logger = logger
+    return _logger
+
+class _Span:
+    def __init__(self, name, spans):
+        self.name = name
+        self.spans = spans
+
+    def __enter__(self):
+        if TRACE_MEMORY:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record = {"name": self.name, "ms": round((time.perf_counter() - self.started) * 1000, 3)}
+        if TRACE_MEMORY:
+            import tracemalloc
+
+            record["peak_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        self.spans.append(record)
+        return False
+
+def span(name):
+    """Time one phase of the current run; a shared no-op when tracing is off"""
+    if not ENABLED:
+        return _NOOP
+    spans = getattr(_local, "spans", None)
+    if spans is None:
+        return _NOOP
+    return _Span(name, spans)
+
+@contextlib.contextmanager
+def run(kind, **fields):
+    """Collect the spans of one generation and write them as a single JSON line.
+
+    Nested runs join the outer one, so fill_template and the render it calls
+    produce one record.
+    """
+    if not ENABLED or getattr(_local, "spans", None) is not None:
+        yield
+        return
+
+    spans = []
+    _local.spans = spans
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _local.spans = None
+        record = {
+            "run": uuid.uuid4().hex[:12],
+            "kind": kind,
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "ms": round((time.perf_counter() - started) * 1000, 3),
+            "spans": spans
+        }
+        record.update(fields)
+        if error:
+            record["error"] = error
+        try:
+            _get_logger().info(json.dumps(record))
+        except OSError as e:
+            print(f"Warning: could not write trace log: {e}")
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values, or None when there are none"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(log_path=None):
+    """Aggregate p50/p95 wall time (and peak memory) per phase across every logged run"""
+    log_path = log_path or LOG_PATH
+    phases = {}
+    runs = 0
+    for path in sorted(glob.glob(f"{glob.escape(log_path)}*")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                runs += 1
+                phases.setdefault("(total)", {"ms": [], "peak_kb": []})["ms"].append(record["ms"])
+                for entry in record.get("spans", []):
+                    phase = phases.setdefault(entry["name"], {"ms": [], "peak_kb": []})
+                    phase["ms"].append(entry["ms"])
+                    if "peak_kb" in entry:
+                        phase["peak_kb"].append(entry["peak_kb"])
+
+    summary = {}
+    for name, values in phases.items():
+        summary[name] = {
+            "count": len(values["ms"]),
+            "p50_ms": percentile(values["ms"], 50),
+            "p95_ms": percentile(values["ms"], 95),
+            "p95_peak_kb": percentile(values["peak_kb"], 95) if values["peak_kb"] else None
+        }
+    return runs, summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="app.py trace-summary",
+                                     description="Summarise fill_template phase timings from the trace log")
+    parser.add_argument("log", nargs="?", default=None, help=f"Trace log path (default: {LOG_PATH})")
+    args = parser.parse_args(argv)
+
+    runs, summary = summarize(args.log)
+    if not runs:
+        print(f"No traced runs found in {args.log or LOG_PATH}")
+        return 1
+
+    print(f"{runs} run(s)")
+    print(f"{'phase':<24} {'count':>6} {'p50 ms':>10} {'p95 ms':>10} {'p95 peak KB':>12}")
+    for name, stats in sorted(summary.items(), key=lambda item: -item[1]["p50_ms"]):
+        peak = stats["p95_peak_kb"]
+        print(f"{name:<24} {stats['count']:>6} {stats['p50_ms']:>10.2f} {stats['p95_ms']:>10.2f} "
+              f"{'-' if peak is None else f'{peak:.0f}':>12}")
+    return 0
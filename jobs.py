@@ -0,0 +1,139 @@
+import queue
+import threading
+
+POLL_MS = 50
+
+def job_key(data, source=None):
+    """Repeat submits from the same form (source) for the same patient count as the same job.
+
+    A form's patient is its chart number, or its patient name when the chart
+    number is blank. Without a source, chart number and patient name identify
+    the job; a submit with neither is never merged with another.
+    """
+    chart = data.get("chartnum", "").strip().lower()
+    patient = data.get("patient", "").strip().lower()
+    if source is not None:
+        return (source, chart or patient)
+    if not (chart or patient):
+        return (object(), "")
+    return (chart, patient)
+
+class _Job:
+    def __init__(self, key, data):
+        self.key = key
+        self.data = data
+
+class GenerationQueue:
+    """Renders flow sheets on a fixed pool of worker threads.
+
+    render(data) runs on a worker and returns the xlsx bytes. deliver(data,
+    content) and on_error(data, error) run on the Tk main thread, scheduled
+    through root.after, so dialogs and message boxes never run off the main
+    thread. on_status(text) reports queue status, also on the main thread.
+    """
+
+    def __init__(self, root, render, deliver, on_error=None, on_status=None, workers=2):
+        self.root = root
+        self.render = render
+        self.deliver = deliver
+        self.on_error = on_error
+        self.on_status = on_status
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.running = {}
+        self.delivering = False
+        self.closed = False
+        self.last_status = None
+        self.workers = [threading.Thread(target=self._work, daemon=True, name=f"render-{n}") for n in range(workers)]
+        for worker in self.workers:
+            worker.start()
+        self.root.after(POLL_MS, self._poll)
+
+    def submit(self, data, source=None):
+        """Queue a render; a waiting job from the same form and chart is replaced instead of duplicated"""
+        key = job_key(data, source)
+        name = data.get("patient", "").strip() or "unnamed patient"
+        with self.lock:
+            waiting = self.pending.get(key)
+            if waiting is not None:
+                waiting.data = data
+                print(f"Coalesced submit for {name}")
+            elif self.running.get(key) == data:
+                print(f"Ignored duplicate submit for {name}")
+            else:
+                job = _Job(key, data)
+                self.pending[key] = job
+                self.jobs.put(job)
+        self._report()
+
+    def status(self):
+        with self.lock:
+            rendering = len(self.running)
+            waiting = len(self.pending)
+        ready = self.results.qsize()
+        if not (rendering or waiting or ready):
+            return "Ready"
+        parts = []
+        if rendering:
+            parts.append(f"{rendering} rendering")
+        if waiting:
+            parts.append(f"{waiting} waiting")
+        if ready:
+            parts.append(f"{ready} to save")
+        return "Queue: " + ", ".join(parts)
+
+    def close(self):
+        self.closed = True
+        for _ in self.workers:
+            self.jobs.put(None)
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            with self.lock:
+                self.pending.pop(job.key, None)
+                data = job.data
+                self.running[job.key] = data
+            try:
+                result = ("done", data, self.render(data))
+            except Exception as e:
+                print(f"Error in processing thread: {str(e)}")
+                result = ("error", data, e)
+            finally:
+                with self.lock:
+                    self.running.pop(job.key, None)
+            self.results.put(result)
+
+    def _poll(self):
+        """Main thread: hand finished renders to deliver/on_error, one dialog at a time"""
+        if self.closed:
+            return
+        if not self.delivering:
+            try:
+                outcome, data, value = self.results.get_nowait()
+            except queue.Empty:
+                pass
+            else:
+                self.delivering = True
+                try:
+                    if outcome == "done":
+                        self.deliver(data, value)
+                    elif self.on_error:
+                        self.on_error(data, value)
+                except Exception as e:
+                    print(f"Error delivering flow sheet: {str(e)}")
+                finally:
+                    self.delivering = False
+        self._report()
+        self.root.after(POLL_MS, self._poll)
+
+    def _report(self):
+        if self.on_status:
+            text = self.status()
+            if text != self.last_status:
+                self.last_status = text
+                self.on_status(text)
@@ -0,0 +1,178 @@
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+DB_PATH = os.environ.get("FLOWSHEET_DB") or os.path.join(os.path.expanduser("~"), ".flowsheet", "patients.db")
+SEARCH_LIMIT = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    chartnum TEXT NOT NULL,
+    chart_key TEXT NOT NULL,
+    patient TEXT NOT NULL,
+    patient_key TEXT NOT NULL,
+    sheet_date TEXT NOT NULL,
+    saved_day TEXT NOT NULL,
+    saved_at TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS submissions_chart ON submissions (chart_key, saved_day);
+CREATE INDEX IF NOT EXISTS submissions_patient ON submissions (patient_key);
+CREATE INDEX IF NOT EXISTS submissions_day ON submissions (saved_day);
+
+-- One row per chart pointing at its latest submission, so prefix search scans charts, not history
+CREATE TABLE IF NOT EXISTS charts (
+    chart_key TEXT PRIMARY KEY,
+    chartnum TEXT NOT NULL,
+    patient TEXT NOT NULL,
+    patient_key TEXT NOT NULL,
+    last_id INTEGER NOT NULL,
+    last_day TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS charts_patient ON charts (patient_key);
+"""
+
+def _key(text):
+    return text.strip().lower()
+
+def _chart_row_key(chartnum, patient):
+    """The charts table's key: the chart number, or the patient name for sheets saved without one"""
+    return _key(chartnum) or "patient:" + _key(patient)
+
+def _prefix_range(prefix):
+    # Every key starting with prefix sorts in [prefix, prefix + U+10FFFF), so the index serves it
+    return prefix, prefix + "\U0010ffff"
+
+class PatientStore:
+    """Every submitted payload, kept in SQLite and indexed by chart number, patient name and day"""
+
+    def __init__(self, path=None):
+        self.path = path or DB_PATH
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(SCHEMA)
+            # Stores written before chartless patients got rows of their own kept all of them in one "" row
+            if self.connection.execute("SELECT 1 FROM charts WHERE chart_key = ''").fetchone():
+                self.connection.execute("DELETE FROM charts WHERE chart_key = ''")
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO charts (chart_key, chartnum, patient, patient_key, last_id, last_day) "
+                    "SELECT 'patient:' || patient_key, chartnum, patient, patient_key, MAX(id), saved_day "
+                    "FROM submissions WHERE chart_key = '' GROUP BY patient_key")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def save(self, data, saved_at=None):
+        """Record one submitted collect_data() payload"""
+        saved_at = saved_at or datetime.now()
+        chartnum = data.get("chartnum", "").strip()
+        patient = data.get("patient", "").strip()
+        saved_day = saved_at.date().isoformat()
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO submissions (chartnum, chart_key, patient, patient_key, sheet_date, saved_day, saved_at, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (chartnum, _key(chartnum), patient, _key(patient), data.get("date", ""),
+                 saved_day, saved_at.isoformat(timespec="seconds"), json.dumps(data, ensure_ascii=False)))
+            self.connection.execute(
+                "INSERT OR REPLACE INTO charts (chart_key, chartnum, patient, patient_key, last_id, last_day) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (_chart_row_key(chartnum, patient), chartnum, patient, _key(patient), cursor.lastrowid, saved_day))
+            return cursor.lastrowid
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        """Latest submission per chart whose chart number or patient name starts with text"""
+        prefix = _key(text)
+        if not prefix:
+            return []
+        low, high = _prefix_range(prefix)
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT last_id AS id, chartnum, patient, last_day AS saved_day FROM charts"
+                " WHERE chart_key >= ? AND chart_key < ? AND chartnum != ''"
+                " UNION"
+                " SELECT last_id, chartnum, patient, last_day FROM charts"
+                " WHERE patient_key >= ? AND patient_key < ?"
+                " ORDER BY id DESC LIMIT ?",
+                (low, high, low, high, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def load(self, submission_id):
+        with self.lock:
+            row = self.connection.execute("SELECT payload FROM submissions WHERE id = ?", (submission_id,)).fetchone()
+        return json.loads(row["payload"]) if row else None
+
+    def previous_orders(self, chartnum, today=None):
+        """(day, payload) of the last submission for a chart before today, or None.
+
+        Normally that is yesterday's; after a day off it is the most recent one.
+        """
+        today = today or date.today()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT saved_day, payload FROM submissions WHERE chart_key = ? AND saved_day < ? "
+                "ORDER BY saved_day DESC, id DESC LIMIT 1",
+                (_key(chartnum), today.isoformat())).fetchone()
+        return (row["saved_day"], json.loads(row["payload"])) if row else None
+
+    def yesterday(self, today=None):
+        """Every chart's last submission from the day before today"""
+        day = ((today or date.today()) - timedelta(days=1)).isoformat()
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT MAX(id) AS id, chartnum, patient FROM submissions WHERE saved_day = ? "
+                "GROUP BY chart_key, CASE WHEN chart_key = '' THEN patient_key END ORDER BY patient_key",
+                (day,)).fetchall()
+        return [dict(row) for row in rows]
+
+class BackgroundStore:
+    """Runs PatientStore calls on one worker thread so the Tk thread never waits on SQLite.
+
+    Every method returns a Future. The database is opened by the first call,
+    on the worker, so creating this costs nothing at startup.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.store = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="patient-store")
+
+    def _call(self, method, *args):
+        if self.store is None:
+            self.store = PatientStore(self.path)
+        return getattr(self.store, method)(*args)
+
+    def save(self, data):
+        future = self.executor.submit(self._call, "save", data)
+        future.add_done_callback(_report_failure)
+        return future
+
+    def search(self, text):
+        return self.executor.submit(self._call, "search", text)
+
+    def load(self, submission_id):
+        return self.executor.submit(self._call, "load", submission_id)
+
+    def previous_orders(self, chartnum):
+        return self.executor.submit(self._call, "previous_orders", chartnum)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        if self.store is not None:
+            self.store.close()
+
+def _report_failure(future):
+    error = future.exception()
+    if error is not None:
+        print(f"Could not save to the patient store: {error}")
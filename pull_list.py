@@ -0,0 +1,111 @@
+import argparse
+import time
+
+import numpy as np
+
+from ward_schedule import WardSchedule, _entry_schedule
+from xlsx_report import write_report
+
+PULL_LIST_HEADERS = ["Column", "Hour", "Drug", "Dose", "Patient", "Chart #"]
+
+def _drug(medication):
+    """(name, dose) as the pull list groups them; raises for an entry that is not a dict of strings"""
+    return medication.get("name", "").strip() or "(unnamed)", medication.get("dosage", "").strip()
+
+class PullList:
+    """Which drug and dose is due in each hour column, for which patient, across a ward.
+
+    The ward's medication schedules are compiled once into a WardSchedule array;
+    the hour -> drug index and the per-drug counts are read off it in one pass.
+    """
+
+    def __init__(self, patients, layout):
+        self.layout = layout
+        # No treatments: only medications go on a pull list
+        ward = WardSchedule(patients, layout, treatments=())
+
+        self.drugs = []
+        drug_ids = {}
+        ids = np.full(ward.matrix.shape[:2], -1, dtype=np.int64)
+        for p, data in enumerate(patients):
+            for i, medication in enumerate(data.get("medications", [])):
+                drug = _drug(medication)
+                if drug not in drug_ids:
+                    drug_ids[drug] = len(self.drugs)
+                    self.drugs.append(drug)
+                ids[p, i] = drug_ids[drug]
+
+        patient_idx, item_idx, slots = np.nonzero(ward.matrix)
+        drugs = ids[patient_idx, item_idx]
+
+        self.counts = np.zeros((len(self.drugs), len(layout.columns)), dtype=np.int64)
+        np.add.at(self.counts, (drugs, slots), 1)
+
+        # Index entries by hour column, then drug, then patient order
+        order = np.lexsort((patient_idx, drugs, slots))
+        self.entries = []
+        for k in order:
+            patient = patients[patient_idx[k]]
+            name, dose = self.drugs[drugs[k]]
+            self.entries.append((int(slots[k]), name, dose, patient.get("patient", ""), patient.get("chartnum", "")))
+
+    @classmethod
+    def from_manifest(cls, patients, manifest):
+        from schedule import layout_for
+
+        return cls(patients, layout_for(manifest))
+
+    def due_in(self, slot):
+        """(drug, dose, patient, chart number) entries due in one hour column"""
+        return [entry[1:] for entry in self.entries if entry[0] == slot]
+
+    def rows(self):
+        for slot, name, dose, patient, chart in self.entries:
+            yield [self.layout.columns[slot], self.layout.hours[slot], name, dose, patient, chart]
+
+    def write_xlsx(self, stream=None):
+        """Write the pull list and per-drug hourly counts; returns bytes when no stream is given"""
+        pull_rows = [PULL_LIST_HEADERS]
+        pull_rows.extend(self.rows())
+
+        count_rows = [["Drug", "Dose"] + [f"{column} ({hour})" for column, hour in
+                                          zip(self.layout.columns, self.layout.hours)] + ["Total"]]
+        for (name, dose), counts in sorted(zip(self.drugs, self.counts.tolist())):
+            count_rows.append([name, dose] + counts + [sum(counts)])
+        count_rows.append(["Total", ""] + self.counts.sum(axis=0).tolist() + [int(self.counts.sum())])
+
+        return write_report([("Pull List", pull_rows), ("Counts", count_rows)], stream)
+
+def main(argv=None):
+    from batch import load_records
+    from flowsheet import resource_path
+    from template_cache import load_manifest
+
+    parser = argparse.ArgumentParser(prog="app.py pull-list",
+                                     description="Build a pharmacy pull list from a ward file of patient payloads")
+    parser.add_argument("input", help="JSONL or CSV file, one patient payload per record")
+    parser.add_argument("-o", "--output", default="pull-list.xlsx", help="Report to write")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    patients = []
+    for number, data, error in load_records(args.input):
+        if error:
+            print(f"Record {number}: skipped ({error})")
+            continue
+        # One patient's malformed medication would otherwise fail the whole ward's report
+        try:
+            for medication in data.get("medications", []):
+                _drug(medication)
+                _entry_schedule(medication)
+        except (AttributeError, TypeError, ValueError) as e:
+            print(f"Record {number}: skipped ({e})")
+            continue
+        patients.append(data)
+
+    pull_list = PullList.from_manifest(patients, load_manifest(resource_path("template.xlsx")))
+    with open(args.output, "wb") as f:
+        pull_list.write_xlsx(f)
+    print(f"{len(pull_list.entries)} doses of {len(pull_list.drugs)} drug(s) for {len(patients)} patient(s) "
+          f"written to {args.output} in {time.perf_counter() - started:.2f}s")
+    return 0
@@ -0,0 +1,240 @@
+# Read completed flow sheets back into tidy records: one row per item and
+# hour slot that was scheduled or has something written in it. Sheets are
+# streamed with openpyxl's read-only mode on a process pool, and the row
+# layout comes from the same template manifest the generator uses.
+import argparse
+import csv
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from schedule import TimeLayout
+from style_registry import FILL_COLORS
+from template_cache import LABEL_COLUMN, TIME_COLUMNS, TIME_ROW, hour_columns, load_manifest
+
+FIELDS = ["file", "sheet", "chart", "patient", "date", "item", "kind", "slot", "hour",
+          "scheduled", "administered", "value"]
+PARQUET_BATCH_ROWS = 50000
+
+_plans = {}
+
+def _cell_index(coordinate):
+    column = coordinate.rstrip("0123456789")
+    return int(coordinate[len(column):]), column
+
+class _RowPlan:
+    """Which rows and cells of a flow sheet carry items and header fields, from the manifest"""
+
+    def __init__(self, manifest):
+        self.items = []  # (first row, two rows?, kind, fixed name or None)
+        for name, info in manifest["treatment_rows"].items():
+            self.items.append((info["row"], info["merged"], "treatment", name))
+        for row in manifest["medication_rows"]:
+            self.items.append((row, True, "medication", None))
+        self.header = {}
+        for field, token in (("chart", "{chartnum}"), ("patient", "{patient}"), ("date", "{date}")):
+            coordinates = manifest["placeholders"].get(token)
+            if coordinates:
+                self.header[field] = _cell_index(coordinates[0])
+        self.last_row = max([row + (1 if two_rows else 0) for row, two_rows, _, _ in self.items] +
+                            [row for row, _ in self.header.values()] + [TIME_ROW])
+        self.wanted_rows = {TIME_ROW} | {row for row, _ in self.header.values()}
+        for row, two_rows, _, _ in self.items:
+            self.wanted_rows.update((row, row + 1) if two_rows else (row,))
+
+def _plan_for(manifest):
+    plan = _plans.get(manifest["template_hash"])
+    if plan is None:
+        plan = _RowPlan(manifest)
+        _plans[manifest["template_hash"]] = plan
+    return plan
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def _highlighted(cell):
+    fill = getattr(cell, "fill", None)
+    if fill is None or fill.fill_type != "solid":
+        return False
+    return str(fill.fgColor.rgb or "")[-6:].upper() == FILL_COLORS["highlight"]
+
+def _read_sheet(sheet, plan, columns):
+    """{row: {column letter: cell}} for just the rows the plan needs, streamed once"""
+    rows = {}
+    for row in sheet.iter_rows(min_row=1, max_row=plan.last_row):
+        cells = [cell for cell in row if hasattr(cell, "column_letter")]
+        if not cells or cells[0].row not in plan.wanted_rows:
+            continue
+        rows[cells[0].row] = {cell.column_letter: cell for cell in cells
+                              if cell.column_letter in columns}
+    return rows
+
+def extract_file(path, template_path=None):
+    """Worker entry point: every record of one workbook, or (path, error) on failure"""
+    import openpyxl
+
+    from flowsheet import resource_path
+
+    manifest = load_manifest(template_path or resource_path("template.xlsx"))
+    plan = _plan_for(manifest)
+    wanted_columns = set(TIME_COLUMNS) | {LABEL_COLUMN} | {column for _, column in plan.header.values()}
+    records = []
+    try:
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    except Exception as e:
+        return path, [], str(e)
+    try:
+        for sheet in workbook.worksheets:
+            rows = _read_sheet(sheet, plan, wanted_columns)
+            # The sheet's own row 5, read the same way the generator reads it
+            time_row = rows.get(TIME_ROW, {})
+            time_columns = hour_columns(lambda column: getattr(time_row.get(column), "value", None))
+            if not time_columns:
+                continue  # Not a flow sheet
+            layout = TimeLayout(time_columns)
+
+            header = {field: _text(getattr(rows.get(row, {}).get(column), "value", None))
+                      for field, (row, column) in plan.header.items()}
+            for first_row, two_rows, kind, name in plan.items:
+                item = name or _text(getattr(rows.get(first_row, {}).get(LABEL_COLUMN), "value", None))
+                item_rows = [rows.get(first_row, {})] + ([rows.get(first_row + 1, {})] if two_rows else [])
+                for slot, (column, hour) in enumerate(zip(layout.columns, layout.hours)):
+                    cells = [cells_by_column.get(column) for cells_by_column in item_rows]
+                    values = [_text(getattr(cell, "value", None)) for cell in cells]
+                    value = " / ".join(value for value in values if value)
+                    scheduled = any(_highlighted(cell) for cell in cells if cell is not None)
+                    if not (value or scheduled):
+                        continue
+                    records.append({"file": os.path.basename(path), "sheet": sheet.title,
+                                    "chart": header.get("chart", ""), "patient": header.get("patient", ""),
+                                    "date": header.get("date", ""), "item": item, "kind": kind,
+                                    "slot": slot, "hour": hour, "scheduled": scheduled,
+                                    "administered": bool(value), "value": value})
+    except Exception as e:
+        return path, [], str(e)
+    finally:
+        workbook.close()
+    return path, records, None
+
+def find_sheets(directory, recursive=False):
+    """The .xlsx files under directory in a stable order, skipping Excel's ~$ lock files"""
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".xlsx") and not name.startswith("~$"):
+                found.append(os.path.join(root, name))
+        if not recursive:
+            break
+    return found
+
+class _CsvSink:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=FIELDS)
+        self.writer.writeheader()
+
+    def write(self, records):
+        self.writer.writerows(records)
+
+    def close(self):
+        self.file.close()
+
+class _ParquetSink:
+    """Buffers records into row groups of PARQUET_BATCH_ROWS; needs pyarrow"""
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow); write .csv instead")
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([
+            ("file", pyarrow.string()), ("sheet", pyarrow.string()), ("chart", pyarrow.string()),
+            ("patient", pyarrow.string()), ("date", pyarrow.string()), ("item", pyarrow.string()),
+            ("kind", pyarrow.string()), ("slot", pyarrow.int16()), ("hour", pyarrow.int8()),
+            ("scheduled", pyarrow.bool_()), ("administered", pyarrow.bool_()), ("value", pyarrow.string())
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.buffer = []
+
+    def write(self, records):
+        self.buffer.extend(records)
+        if len(self.buffer) >= PARQUET_BATCH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if self.buffer:
+            self.writer.write_table(self.pyarrow.Table.from_pylist(self.buffer, schema=self.schema))
+            self.buffer = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+def extract(paths, output_path, workers=None, template_path=None):
+    """Extract every workbook in paths into one CSV or Parquet file; returns a summary dict.
+
+    Files are handed to the pool in order with at most a few per worker
+    outstanding, and each file's records are written as soon as it comes
+    back, so memory does not grow with the number of files.
+    """
+    sink = _ParquetSink(output_path) if output_path.lower().endswith(".parquet") else _CsvSink(output_path)
+    workers = workers or os.cpu_count() or 1
+    window = workers * 4
+    summary = {"files": 0, "failed": 0, "records": 0, "seconds": 0.0}
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            remaining = iter(paths)
+            while True:
+                while len(pending) < window:
+                    path = next(remaining, None)
+                    if path is None:
+                        break
+                    pending.append(executor.submit(extract_file, path, template_path))
+                if not pending:
+                    break
+                path, records, error = pending.popleft().result()
+                summary["files"] += 1
+                if error:
+                    summary["failed"] += 1
+                    print(f"{os.path.basename(path)}: skipped ({error})")
+                    continue
+                sink.write(records)
+                summary["records"] += len(records)
+    finally:
+        sink.close()
+    summary["seconds"] = time.perf_counter() - started
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="app.py readback",
+                                     description="Extract the hourly entries of completed flow sheets")
+    parser.add_argument("directory", help="Folder of completed .xlsx flow sheets")
+    parser.add_argument("-o", "--output", default="flowsheet-entries.csv",
+                        help="CSV or .parquet file to write (Parquet needs pyarrow)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Include sub-folders")
+    args = parser.parse_args(argv)
+
+    paths = find_sheets(args.directory, args.recursive)
+    if not paths:
+        print(f"No .xlsx files found in {args.directory}")
+        return 1
+    try:
+        summary = extract(paths, args.output, args.workers)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return 1
+    rate = summary["files"] / summary["seconds"] if summary["seconds"] > 0 else 0.0
+    print(f"{summary['records']} record(s) from {summary['files']} file(s) in {summary['seconds']:.2f}s "
+          f"({rate:.1f} files/sec), {summary['failed']} skipped; written to {args.output}")
+    return 1 if summary["failed"] else 0
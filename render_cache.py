@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import threading
+
+from batch import normalize_payload
+from instrumentation import span
+
+# FLOWSHEET_CACHE=0 turns the cache off; the directory and size cap can be overridden
+ENABLED = os.environ.get("FLOWSHEET_CACHE", "1") != "0"
+CACHE_DIR = os.environ.get("FLOWSHEET_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".flowsheet", "cache")
+MAX_CACHE_MB = float(os.environ.get("FLOWSHEET_CACHE_MB", "64"))
+
+# Part of every cache key. Bump it with any change that alters the bytes a payload renders to
+# (e.g. continuation sheets, inline placeholders), so entries from older versions stop matching.
+RENDER_VERSION = 2
+
+_default = None
+_default_lock = threading.Lock()
+
+def payload_key(data, template_hash, engine):
+    """Canonical hash of a normalized payload, the template it renders into, the engine and RENDER_VERSION"""
+    canonical = json.dumps(normalize_payload(data), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    digest = hashlib.sha256()
+    for part in (str(RENDER_VERSION), template_hash, engine, canonical):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class RenderCache:
+    """Rendered xlsx bytes on disk, keyed by payload_key, capped in size with LRU eviction.
+
+    Renders are byte-for-byte deterministic (see flowsheet.save_workbook), so a
+    hit returns exactly what rendering again would produce. Several processes
+    may share a directory; entries are written atomically and eviction is best
+    effort across them.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or CACHE_DIR
+        self.max_bytes = int(MAX_CACHE_MB * 1024 * 1024) if max_bytes is None else max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (size, last used), oldest first once sorted
+        self.entries = {}
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            if name.endswith(".xlsx"):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                self.entries[name[:-5]] = (stat.st_size, stat.st_mtime)
+        self.size = sum(size for size, _ in self.entries.values())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.xlsx")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            # mtime doubles as the last-used time for LRU order
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self.misses += 1
+                old = self.entries.pop(key, None)
+                if old:
+                    self.size -= old[0]
+            return None
+        with self.lock:
+            self.hits += 1
+            if key not in self.entries:
+                self.size += len(content)
+            self.entries[key] = (len(content), os.path.getmtime(path))
+        return content
+
+    def put(self, key, content):
+        if len(content) > self.max_bytes:
+            return
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Warning: could not write render cache entry: {e}")
+            return
+        with self.lock:
+            old = self.entries.get(key)
+            self.size += len(content) - (old[0] if old else 0)
+            self.entries[key] = (len(content), os.path.getmtime(path))
+            self._evict()
+
+    def _evict(self):
+        if self.size <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self.entries.items(), key=lambda item: item[1][1]):
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            del self.entries[key]
+            self.size -= size
+            self.evictions += 1
+
+    def fetch(self, data, engine=None):
+        """Return (xlsx bytes, True) from the cache, or render, store and return (bytes, False)"""
+        from flowsheet import render_bytes, resource_path
+        from template_cache import load_manifest
+
+        engine = engine or os.environ.get("FLOWSHEET_ENGINE", "openpyxl")
+        with span("cache_lookup"):
+            key = payload_key(data, load_manifest(resource_path("template.xlsx"))["template_hash"], engine)
+            content = self.get(key)
+        if content is not None:
+            return content, True
+        content = render_bytes(data, engine)
+        self.put(key, content)
+        return content, False
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes
+            }
+
+def default_cache():
+    """The shared cache in CACHE_DIR, or None when FLOWSHEET_CACHE=0"""
+    global _default
+    if not ENABLED:
+        return None
+    with _default_lock:
+        if _default is None:
+            try:
+                _default = RenderCache()
+            except OSError as e:
+                print(f"Warning: render cache disabled: {e}")
+                return None
+        return _default
+
+def render_cached(data, engine=None):
+    """Render through the default cache, or straight through when it is disabled"""
+    content, hit = fetch_cached(data, engine)
+    if hit:
+        print("Render cache hit")
+    return content
+
+def fetch_cached(data, engine=None):
+    """(xlsx bytes, whether they came from the cache) through the default cache"""
+    cache = default_cache()
+    if cache is None:
+        from flowsheet import render_bytes
+
+        return render_bytes(data, engine), False
+    return cache.fetch(data, engine)
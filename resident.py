@@ -0,0 +1,163 @@
+# Resident mode: one long-lived instance keeps Tk, the template and the render
+# backend loaded, and later launches hand their window over to it through a
+# localhost socket instead of starting from scratch. The resident writes its
+# port and a random token to RESIDENT_FILE; a launch that cannot reach it just
+# starts normally.
+import argparse
+import hmac
+import json
+import os
+import queue
+import secrets
+import socket
+import threading
+
+RESIDENT_FILE = os.environ.get("FLOWSHEET_RESIDENT_FILE") or os.path.join(
+    os.path.expanduser("~"), ".flowsheet", "resident.json")
+CONNECT_TIMEOUT = 0.5
+POLL_MS = 50
+MAX_MESSAGE_BYTES = 1024 * 1024
+
+def resident_requested(argv):
+    """Resident mode is turned on with --resident or FLOWSHEET_RESIDENT=1"""
+    return "--resident" in argv or os.environ.get("FLOWSHEET_RESIDENT") == "1"
+
+def _read_resident_file():
+    try:
+        with open(RESIDENT_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def send(command, data=None, timeout=CONNECT_TIMEOUT):
+    """Send one command to the resident instance; returns its reply, or None if none is running"""
+    info = _read_resident_file()
+    if not info:
+        return None
+    message = {"token": info.get("token", ""), "command": command}
+    if data is not None:
+        message["data"] = data
+    try:
+        with socket.create_connection(("127.0.0.1", info["port"]), timeout=timeout) as connection:
+            connection.sendall(json.dumps(message).encode("utf-8") + b"\n")
+            with connection.makefile("rb") as reply:
+                return json.loads(reply.readline(MAX_MESSAGE_BYTES) or b"null")
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def hand_off(data=None):
+    """Ask a running resident instance to open a patient window; True if it did"""
+    reply = send("open", data)
+    return bool(reply and reply.get("ok"))
+
+class ResidentServer:
+    """Accepts commands from later launches and runs them on the Tk main thread.
+
+    on_open(data) runs for "open" and on_shutdown() for "shutdown", both
+    through root.after, so they may touch widgets.
+    """
+
+    def __init__(self, root, on_open, on_shutdown):
+        self.root = root
+        self.on_open = on_open
+        self.on_shutdown = on_shutdown
+        self.token = secrets.token_hex(16)
+        self.commands = queue.Queue()
+        self.closed = False
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(8)
+        self.port = self.listener.getsockname()[1]
+        self._write_resident_file()
+
+        threading.Thread(target=self._accept, daemon=True, name="resident").start()
+        self.root.after(POLL_MS, self._poll)
+        print(f"Resident instance listening on 127.0.0.1:{self.port}")
+
+    def _write_resident_file(self):
+        os.makedirs(os.path.dirname(RESIDENT_FILE) or ".", exist_ok=True)
+        tmp_path = f"{RESIDENT_FILE}.{os.getpid()}.tmp"
+        # Only this user may read the token
+        descriptor = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+            json.dump({"port": self.port, "token": self.token, "pid": os.getpid()}, f)
+        os.replace(tmp_path, RESIDENT_FILE)
+
+    def _accept(self):
+        while not self.closed:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError:
+                return
+            with connection:
+                connection.settimeout(2)
+                try:
+                    reply = self._handle(connection)
+                    connection.sendall(json.dumps(reply).encode("utf-8") + b"\n")
+                except (OSError, ValueError) as e:
+                    print(f"Resident: bad request ({str(e)})")
+
+    def _handle(self, connection):
+        with connection.makefile("rb") as request:
+            message = json.loads(request.readline(MAX_MESSAGE_BYTES))
+        if not hmac.compare_digest(str(message.get("token", "")), self.token):
+            return {"ok": False, "error": "Bad token"}
+        command = message.get("command")
+        if command == "ping":
+            return {"ok": True, "pid": os.getpid()}
+        if command not in ("open", "shutdown"):
+            return {"ok": False, "error": f"Unknown command '{command}'"}
+        self.commands.put((command, message.get("data")))
+        return {"ok": True}
+
+    def _poll(self):
+        """Main thread: run queued commands"""
+        if self.closed:
+            return
+        while True:
+            try:
+                command, data = self.commands.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if command == "open":
+                    self.on_open(data)
+                else:
+                    self.on_shutdown()
+            except Exception as e:
+                print(f"Resident: {command} failed: {str(e)}")
+        if not self.closed:
+            self.root.after(POLL_MS, self._poll)
+
+    def close(self):
+        """Stop listening and remove the resident file if it is still ours"""
+        if self.closed:
+            return
+        self.closed = True
+        self.listener.close()
+        info = _read_resident_file()
+        if info and info.get("token") == self.token:
+            try:
+                os.remove(RESIDENT_FILE)
+            except OSError:
+                pass
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="app.py resident",
+                                     description="Check on or stop the resident flow sheet instance")
+    parser.add_argument("action", choices=["status", "stop"])
+    args = parser.parse_args(argv)
+
+    reply = send("ping" if args.action == "status" else "shutdown")
+    if not reply:
+        print("No resident instance is running")
+        return 1
+    if not reply.get("ok"):
+        print(f"Resident instance refused: {reply.get('error')}")
+        return 1
+    if args.action == "status":
+        print(f"Resident instance running (pid {reply.get('pid')})")
+    else:
+        print("Resident instance is shutting down")
+    return 0
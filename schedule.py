@@ -0,0 +1,84 @@
+from template_cache import TIME_ROW, hour_columns
+
+_layouts = {}
+
+class TimeLayout:
+    """The row-5 time columns of a template and the slots each schedule lands on"""
+
+    def __init__(self, hour_columns):
+        self.columns = [col for col, _ in hour_columns]
+        self.hours = [hour for _, hour in hour_columns]
+        # An hour label appears twice on a 24-column sheet, so keep every position
+        self.positions = {}
+        for index, hour in enumerate(self.hours):
+            self.positions.setdefault(hour, []).append(index)
+        self._slots = {}
+
+    @classmethod
+    def from_sheet(cls, sheet):
+        """Read the hour labels straight off a worksheet's row 5"""
+        return cls(hour_columns(lambda column: sheet[f"{column}{TIME_ROW}"].value))
+
+    def slots_for(self, start_hour, frequency):
+        """Indexes into self.columns highlighted for a (start_hour, frequency) pair"""
+        key = (start_hour, frequency)
+        slots = self._slots.get(key)
+        if slots is None:
+            # Read off the same slot table the ward-wide schedule uses
+            from ward_schedule import slot_table, table_index
+
+            slots = tuple(int(index) for index in slot_table(self)[table_index(self, start_hour, frequency)].nonzero()[0])
+            self._slots[key] = slots
+        return slots
+
+def layout_for(manifest):
+    """One TimeLayout per template, shared by every sheet rendered from it"""
+    key = manifest["template_hash"]
+    layout = _layouts.get(key)
+    if layout is None:
+        layout = TimeLayout(manifest["hour_columns"])
+        _layouts[key] = layout
+    return layout
+
+def parse_schedule(start_hour, frequency, row, quiet=False):
+    """Validate form values, returning (start_hour, frequency) ints or None"""
+    report = (lambda message: None) if quiet else print
+    if not start_hour or not frequency:
+        report(f"Missing start_hour or frequency for row {row}")
+        return None
+
+    try:
+        start_hour = int(start_hour)
+        frequency = int(frequency)
+        if not (1 <= start_hour <= 12):
+            report(f"Invalid start hour {start_hour} for row {row}")
+            return None
+    except (ValueError, TypeError):
+        report(f"Invalid start_hour ({start_hour}) or frequency ({frequency}) for row {row}")
+        return None
+
+    if frequency < 1:
+        report(f"Invalid frequency {frequency} for row {row}")
+        return None
+
+    return start_hour, frequency
+
+def scheduled_cells(layout, start_hour, frequency, row, two_rows=False):
+    """Coordinates to highlight for one treatment or medication row"""
+    cells = []
+    for index in layout.slots_for(start_hour, frequency):
+        col = layout.columns[index]
+        cells.append(f"{col}{row}")
+        # Merged-pair treatments and medications span the row below as well
+        if two_rows:
+            cells.append(f"{col}{row + 1}")
+    return cells
+
+def preview_slots(layout, start_hour, frequency):
+    """Slot indexes for a form row as typed: () while a field is empty, None if the values are invalid"""
+    if not start_hour or not frequency:
+        return ()
+    schedule = parse_schedule(start_hour, frequency, None, quiet=True)
+    if schedule is None:
+        return None
+    return layout.slots_for(*schedule)
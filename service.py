@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import collections
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+from batch import normalize_payload
+from instrumentation import percentile
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+MAX_BODY_BYTES = 1024 * 1024
+LATENCY_WINDOW = 1000
+# xlsxpatch keeps the parsed template in each worker; openpyxl would re-parse it on every request
+DEFAULT_ENGINE = "xlsxpatch"
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+def content_disposition(filename):
+    """attachment header for any patient name: an ASCII-only filename plus the real one as filename*"""
+    # Quotes, backslashes and control characters (CR/LF would start a new header) never reach the head
+    fallback = "".join(c if 32 <= ord(c) < 127 and c not in '"\\' else "_" for c in filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+def _response_head(status, headers, body):
+    head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    headers["Content-Length"] = str(len(body))
+    headers["Connection"] = "close"
+    head += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1")
+
+def _init_worker(engine):
+    """Load the template, manifest and schedule layout once per worker process"""
+    from flowsheet import render_bytes
+
+    # A throwaway render pulls the manifest, layout and template into memory. xlsxpatch keeps the
+    # template parsed; openpyxl keeps only its bytes and still parses them on every render.
+    render_bytes(normalize_payload({}), engine)
+
+def start_render_pool(workers, engine=None):
+    """A ProcessPoolExecutor of workers render processes, all started and warm before it is returned"""
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(engine,))
+    # Workers are spawned on demand; start them all now so the first renders find them warm
+    for _ in range(workers):
+        executor.submit(int)
+    return executor
+
+def _render(data, engine):
+    from flowsheet import default_filename
+    from render_cache import fetch_cached
+
+    content, cached = fetch_cached(data, engine)
+    return content, default_filename(data), cached
+
+class RenderService:
+    """Accepts collect_data() payloads over HTTP and returns rendered xlsx bytes"""
+
+    def __init__(self, workers=None, max_queue=32, engine=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.engine = engine or os.environ.get("FLOWSHEET_ENGINE") or DEFAULT_ENGINE
+        self.executor = None
+        self.slots = None
+        self.in_flight = 0
+        self.queued = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.cache_hits = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+
+    def start(self):
+        self.executor = start_render_pool(self.workers, self.engine)
+        self.slots = asyncio.Semaphore(self.workers)
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def stats(self):
+        def pct(p):
+            value = percentile(self.latencies, p)
+            return None if value is None else round(value * 1000, 2)
+
+        return {
+            "engine": self.engine,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "max_queue": self.max_queue,
+            "peak_in_flight": self.peak_in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "cache_hits": self.cache_hits,
+            "latency_ms": {"p50": pct(50), "p95": pct(95), "p99": pct(99),
+                           "last": round(self.latencies[-1] * 1000, 2) if self.latencies else None},
+            "uptime_s": round(time.time() - self.started, 1)
+        }
+
+    async def render(self, data):
+        """Render on the worker pool, waiting for a free worker if all are busy"""
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise OverflowError("Render queue is full")
+
+        started = time.perf_counter()
+        self.queued += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, _render, data, self.engine)
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+            self.latencies.append(time.perf_counter() - started)
+
+    async def handle(self, reader, writer):
+        try:
+            # Building the head is inside the handler too, so a header that cannot be sent still gets a reply
+            try:
+                status, headers, body = await self._dispatch(reader)
+                response = _response_head(status, headers, body) + body
+            except Exception as e:
+                print(f"Error handling request: {str(e)}")
+                body = json.dumps({"error": str(e)}).encode()
+                response = _response_head(500, {"Content-Type": "application/json"}, body) + body
+            writer.write(response)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            return 400, {}, b""
+        method, path = request_line.split(" ")[:2]
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        def reply(status, payload):
+            return status, {"Content-Type": "application/json"}, json.dumps(payload).encode("utf-8")
+
+        if path == "/stats":
+            return reply(200, self.stats()) if method == "GET" else reply(405, {"error": "Use GET"})
+        if path == "/health":
+            return reply(200, {"ok": True})
+        if path != "/render":
+            return reply(404, {"error": f"No route for {path}"})
+        if method != "POST":
+            return reply(405, {"error": "Use POST"})
+
+        length = int(headers.get("content-length", "0") or 0)
+        if length > MAX_BODY_BYTES:
+            return reply(413, {"error": "Payload too large"})
+        body = await reader.readexactly(length)
+
+        self.requests += 1
+        try:
+            data = normalize_payload(json.loads(body))
+        except (ValueError, TypeError) as e:
+            self.errors += 1
+            return reply(400, {"error": str(e)})
+
+        try:
+            content, filename, cached = await self.render(data)
+        except OverflowError as e:
+            return reply(503, {"error": str(e)})
+        except Exception as e:
+            self.errors += 1
+            return reply(500, {"error": str(e)})
+
+        if cached:
+            self.cache_hits += 1
+        print(f"Rendered {filename} in {self.latencies[-1] * 1000:.1f} ms{' (cached)' if cached else ''}")
+        return 200, {"Content-Type": XLSX_CONTENT_TYPE,
+                     "Content-Disposition": content_disposition(filename),
+                     "X-Render-Cache": "hit" if cached else "miss"}, content
+
+async def serve(host="127.0.0.1", port=8765, workers=None, max_queue=32, engine=None, ready=None):
+    """Run the render service until cancelled"""
+    service = RenderService(workers=workers, max_queue=max_queue, engine=engine)
+    service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    bound = server.sockets[0].getsockname()
+    print(f"Flow sheet service listening on http://{bound[0]}:{bound[1]} ({service.workers} workers)")
+    if ready:
+        ready(service, bound)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="app.py serve",
+                                     description="Serve flow sheet rendering over HTTP on localhost")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Render worker processes")
+    parser.add_argument("--max-queue", type=int, default=32, help="Requests allowed to wait for a worker")
+    parser.add_argument("--engine", choices=["openpyxl", "xlsxpatch"], default=None,
+                        help=f"Rendering engine (default: $FLOWSHEET_ENGINE or {DEFAULT_ENGINE})")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_queue, args.engine))
+    except KeyboardInterrupt:
+        print("Service stopped")
+    return 0
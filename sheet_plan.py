@@ -0,0 +1,176 @@
+import math
+import re
+
+from instrumentation import span
+from schedule import layout_for, parse_schedule, scheduled_cells
+from substitution import compile_cells, substitute
+
+PROCEDURE_DATE_RE = re.compile(r"^\{date(\d+)\}$")
+MAX_TITLE = 31
+
+_procedure_slots = {}
+
+def procedure_slots(manifest):
+    """Numbers N of the {dateN}/{notedN} procedure placeholder pairs, in sheet order"""
+    slots = _procedure_slots.get(manifest["template_hash"])
+    if slots is None:
+        placeholders = manifest["placeholders"]
+        slots = sorted(int(match.group(1)) for match in map(PROCEDURE_DATE_RE.match, placeholders)
+                       if match and f"{{noted{match.group(1)}}}" in placeholders)
+        _procedure_slots[manifest["template_hash"]] = slots
+    return slots
+
+def sheet_capacity(manifest):
+    """How many medications and procedures one sheet of this template holds"""
+    return {"medications": len(manifest["medication_rows"]), "procedures": len(procedure_slots(manifest))}
+
+def paginate(data, manifest):
+    """Split a payload into one payload per sheet when it overflows the template.
+
+    The first page is the patient's sheet as usual. Continuation pages repeat
+    the header fields and carry the next medications and procedures; their
+    treatment rows stay empty so treatments are only charted once. A payload
+    that fits is returned unchanged as the only page.
+    """
+    capacity = sheet_capacity(manifest)
+    medications = data.get("medications", [])
+    procedures = data.get("procedures", [])
+    pages = max(1, math.ceil(len(medications) / max(capacity["medications"], 1)),
+                math.ceil(len(procedures) / max(capacity["procedures"], 1)))
+    if pages == 1:
+        return [data]
+
+    result = []
+    for page in range(pages):
+        page_data = dict(data)
+        page_data["medications"] = medications[page * capacity["medications"]:(page + 1) * capacity["medications"]]
+        page_data["procedures"] = procedures[page * capacity["procedures"]:(page + 1) * capacity["procedures"]]
+        if page:
+            page_data["treatments"] = {}
+        result.append(page_data)
+    return result
+
+def page_title(title, page):
+    """Sheet name for page 2, 3, ... of a paginated flow sheet, within Excel's 31 characters"""
+    if page == 1:
+        return title
+    tail = f" p{page}"
+    return title[:MAX_TITLE - len(tail)] + tail
+
+def build_replacements(data, manifest):
+    """Return one lookup from every placeholder token the template uses to its text.
+
+    Header fields, the inline {a}/{e} values, {medN} and {dateN}/{notedN} all
+    share the one dict; tokens with nothing to fill map to "".
+    """
+    capacity = sheet_capacity(manifest)
+    replacements = {
+        "{cpr_dnr}": data.get("cpr_dnr", ""),
+        "{patient}": data.get("patient", ""),
+        "{chartnum}": data.get("chartnum", ""),
+        "{date}": data.get("date", ""),
+        "{owner}": data.get("owner", ""),
+        "{problem}": data.get("problem", ""),
+        "{dvm}": data.get("dvm", ""),
+        "{age}": data.get("age", ""),
+        "{sex}": data.get("sex", ""),
+        "{ivcinfo}": data.get("ivcinfo", ""),
+        "{techs}": data.get("techs", ""),
+        "{initials}": data.get("initials", ""),
+        "{a}": data.get("a", ""),
+        "{e}": data.get("e", "")
+    }
+
+    # One {medN} per medication row in the template, empty past the last medication
+    medications = data.get("medications", [])
+    for i in range(1, capacity["medications"] + 1):
+        if i <= len(medications):
+            name = medications[i - 1].get("name", "").strip()
+            dosage = medications[i - 1].get("dosage", "").strip()
+            replacements[f"{{med{i}}}"] = f"{name} {dosage}".strip()
+        else:
+            replacements[f"{{med{i}}}"] = ""
+
+    # Add procedure replacements, one per {dateN}/{notedN} pair in the template
+    procedures = data.get("procedures", [])
+    for i, num in enumerate(procedure_slots(manifest)):
+        date_placeholder = f"{{date{num}}}"
+        note_placeholder = f"{{noted{num}}}"
+
+        if i < len(procedures):
+            proc = procedures[i]
+            replacements[date_placeholder] = proc.get("date", "")
+            replacements[note_placeholder] = proc.get("note", "")
+        else:
+            replacements[date_placeholder] = ""
+            replacements[note_placeholder] = ""
+
+    return replacements
+
+def plan_sheet(data, manifest):
+    """Work out every cell value and fill a flow sheet needs, without touching a workbook.
+
+    Returns (values, fills): coordinate -> new value, and coordinate -> a
+    style_registry.FILL_COLORS role. Both rendering engines apply the same plan.
+    Medications and procedures past the template's capacity are not planned;
+    paginate() puts them on continuation sheets.
+    """
+    with span("replacements_build"):
+        replacements = build_replacements(data, manifest)
+    fills = {}
+
+    with span("placeholder_pass"):
+        # Only the cells the manifest recorded as holding placeholders are compiled and visited
+        key = manifest["template_hash"]
+        values = substitute(compile_cells(manifest["cells"], key), replacements, key)
+        # CPR/DNR cells are also coloured
+        for coordinate in manifest["placeholders"].get("{cpr_dnr}", []):
+            if values[coordinate] in ("CPR", "DNR"):
+                fills[coordinate] = values[coordinate].lower()
+
+    plan_highlights(data, manifest, fills)
+
+    return values, fills
+
+def plan_highlights(data, manifest, fills=None):
+    """Add coordinate -> "highlight" for every scheduled treatment and medication slot to fills, and return it"""
+    if fills is None:
+        fills = {}
+    layout = layout_for(manifest)
+
+    with span("treatment_highlighting"):
+        # Treatment rows and their merged-pair flags come from the template layout
+        for treatment_name, info in manifest["treatment_rows"].items():
+            if treatment_name in data.get("treatments", {}):
+                details = data["treatments"][treatment_name]
+                start_hour = details.get("start_hour", "")
+                frequency = details.get("frequency", "")
+
+                if start_hour and frequency and start_hour != "Start Hour" and frequency != "Frequency":
+                    try:
+                        schedule = parse_schedule(start_hour, frequency, info["row"])
+                        if schedule:
+                            for coordinate in scheduled_cells(layout, schedule[0], schedule[1], info["row"],
+                                                              two_rows=info["merged"]):
+                                fills[coordinate] = "highlight"
+                    except Exception as e:
+                        print(f"Error highlighting treatment {treatment_name}: {str(e)}")
+
+    with span("medication_highlighting"):
+        # Medication rows come from the template layout, one per {medN} placeholder
+        for i, (medication, row_num) in enumerate(zip(data.get("medications", []), manifest["medication_rows"]),
+                                                  start=1):
+            start_hour = medication.get("start_hour", "")
+            frequency = medication.get("frequency", "")
+
+            if start_hour and frequency and start_hour != "Start Hour" and frequency != "Frequency":
+                try:
+                    schedule = parse_schedule(start_hour, frequency, row_num)
+                    if schedule:
+                        for coordinate in scheduled_cells(layout, schedule[0], schedule[1], row_num,
+                                                          two_rows=True):
+                            fills[coordinate] = "highlight"
+                except Exception as e:
+                    print(f"Error highlighting medication {i}: {str(e)}")
+
+    return fills
@@ -0,0 +1,32 @@
+import os
+import sys
+import time
+
+def timing_requested(argv=None):
+    """Startup timing is printed with --startup-timing or FLOWSHEET_STARTUP_TIMING=1"""
+    argv = sys.argv[1:] if argv is None else argv
+    return "--startup-timing" in argv or os.environ.get("FLOWSHEET_STARTUP_TIMING") == "1"
+
+class StartupTimer:
+    """Records how long each launch phase takes, up to the first paint"""
+
+    def __init__(self, started=None, enabled=True):
+        self.started = started if started is not None else time.perf_counter()
+        self.last = self.started
+        self.enabled = enabled
+        self.phases = []
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        if not self.enabled:
+            return
+        print("Startup timing:")
+        for phase, seconds in self.phases:
+            print(f"  {phase:<14} {seconds * 1000:8.1f} ms")
+        print(f"  {'interactive':<14} {(self.last - self.started) * 1000:8.1f} ms")
@@ -0,0 +1,100 @@
+import io
+import re
+import weakref
+import zipfile
+
+# Solid fill colours by role; CPR shares the highlight yellow
+FILL_COLORS = {
+    "highlight": "FFFF00",
+    "cpr": "FFFF00",
+    "dnr": "FF0000"
+}
+
+_fills = {}
+_fill_ids = weakref.WeakKeyDictionary()
+_cell_styles = {}
+_derived_xfs = {}
+
+def fill(role):
+    """The one PatternFill object for a role, shared by every workbook in the process"""
+    pattern = _fills.get(role)
+    if pattern is None:
+        from openpyxl.styles import PatternFill
+
+        color = FILL_COLORS[role]
+        pattern = PatternFill(start_color=color, end_color=color, fill_type="solid")
+        _fills[role] = pattern
+    return pattern
+
+def fill_xml(role):
+    # Same serialisation openpyxl uses for the PatternFill above
+    rgb = f"00{FILL_COLORS[role]}"
+    return f'<fill><patternFill patternType="solid"><fgColor rgb="{rgb}"/><bgColor rgb="{rgb}"/></patternFill></fill>'
+
+def _fill_id(workbook, role):
+    ids = _fill_ids.get(workbook)
+    if ids is None:
+        ids = {}
+        _fill_ids[workbook] = ids
+    fill_id = ids.get(role)
+    if fill_id is None:
+        fill_id = workbook._fills.add(fill(role))
+        ids[role] = fill_id
+    return fill_id
+
+def apply_fill(cell, role):
+    """Give an openpyxl cell the fill for role, reusing an interned complete style.
+
+    Cells that start from the same style (plain grid, merged-pair border, CPR
+    header) end up sharing one style record instead of each being hashed
+    through openpyxl's fill descriptor.
+    """
+    from openpyxl.styles.cell_style import StyleArray
+
+    fill_id = _fill_id(cell.parent.parent, role)
+    base = tuple(cell._style) if cell._style else tuple(StyleArray())
+    key = (base, fill_id)
+    style = _cell_styles.get(key)
+    if style is None:
+        style = StyleArray(base)
+        style.fillId = fill_id
+        _cell_styles[key] = style
+    # Cells own their style arrays, so hand out a copy of the interned record
+    cell._style = StyleArray(style)
+
+def derived_xf(base_xf, fill_id):
+    """A cellXfs <xf> record with its fill swapped, for the xlsxpatch engine"""
+    key = (base_xf, fill_id)
+    xf = _derived_xfs.get(key)
+    if xf is None:
+        xf = re.sub(r'\sfillId="\d+"', f' fillId="{fill_id}"', base_xf, count=1)
+        if "applyFill=" in xf:
+            xf = re.sub(r'applyFill="\d"', 'applyFill="1"', xf, count=1)
+        else:
+            xf = xf.replace("<xf ", '<xf applyFill="1" ', 1)
+        _derived_xfs[key] = xf
+    return xf
+
+def style_report(content):
+    """Count the style records in a generated xlsx, to catch style bloat"""
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        styles = archive.read("xl/styles.xml").decode("utf-8")
+        used = set()
+        for name in archive.namelist():
+            if name.startswith("xl/worksheets/") and name.endswith(".xml"):
+                sheet = archive.read(name).decode("utf-8")
+                used.update(re.findall(r'<c\b[^>]*?\ss="(\d+)"', sheet))
+
+    def count(tag, child):
+        section = re.search(rf"<{tag}\b[^>]*?(?:/>|>(.*?)</{tag}>)", styles, re.S)
+        if not section or not section.group(1):
+            return 0
+        return len(re.findall(rf"<{child}\b", section.group(1)))
+
+    return {
+        "cell_styles": count("cellXfs", "xf"),
+        "cell_styles_used": len(used),
+        "fills": count("fills", "fill"),
+        "fonts": count("fonts", "font"),
+        "borders": count("borders", "border")
+    }
@@ -0,0 +1,78 @@
+# Placeholder substitution for template cells. Each cell's text is split into
+# literal runs and {name} tokens once per template; a render then only looks
+# every token up in one merged dict, so no cell is examined more than once.
+import re
+from operator import itemgetter
+
+TOKEN_RE = re.compile(r"\{[^{}]*\}")
+
+_compiled = {}
+_reported = set()
+
+def _tuple_getter(tokens):
+    """itemgetter that always returns a tuple, even for zero or one token"""
+    if len(tokens) > 1:
+        return itemgetter(*tokens)
+    if tokens:
+        token = tokens[0]
+        return lambda lookup: (lookup[token],)
+    return lambda lookup: ()
+
+class CompiledCells:
+    """A template's placeholder cells, tokenized.
+
+    Cells that are exactly one token are filled together by a single
+    itemgetter over their tokens; the rest become format strings with one
+    positional field per token.
+    """
+
+    def __init__(self, cells):
+        # Every cell starts empty, in template order; a copy of this is each render's starting point
+        self.blank = dict.fromkeys(cells, "")
+        self.where = {}  # token -> first coordinate using it, for reporting unknown tokens
+        whole_tokens = []
+        self.whole_coordinates = []
+        self.inline = []  # (coordinate, format string, getter for its tokens)
+        for coordinate, text in cells.items():
+            tokens = TOKEN_RE.findall(text)
+            for token in tokens:
+                self.where.setdefault(token, coordinate)
+            if len(tokens) == 1 and text == tokens[0]:
+                self.whole_coordinates.append(coordinate)
+                whole_tokens.append(tokens[0])
+                continue
+            literals = TOKEN_RE.split(text)
+            pattern = "".join(literal.replace("{", "{{").replace("}", "}}") + (f"{{{i}}}" if i < len(tokens) else "")
+                              for i, literal in enumerate(literals))
+            self.inline.append((coordinate, pattern, _tuple_getter(tokens)))
+        self.whole_getter = _tuple_getter(whole_tokens)
+
+def compile_cells(cells, key=None):
+    """CompiledCells for {coordinate: text}, cached under key (the template hash)"""
+    compiled = _compiled.get(key) if key is not None else None
+    if compiled is None:
+        compiled = CompiledCells(cells)
+        if key is not None:
+            _compiled[key] = compiled
+    return compiled
+
+def substitute(compiled, lookup, key=None):
+    """{coordinate: new text} with every token replaced from lookup; unknown tokens become empty"""
+    try:
+        return _fill(compiled, lookup)
+    except KeyError:
+        pass
+    unknown = compiled.where.keys() - lookup.keys()
+    for token in sorted(unknown):
+        # Once per template and token; a misspelt placeholder would otherwise print on every render
+        if (key, token) not in _reported:
+            _reported.add((key, token))
+            print(f"Unknown placeholder {token} in cell {compiled.where[token]}; left empty")
+    return _fill(compiled, dict(lookup, **dict.fromkeys(unknown, "")))
+
+def _fill(compiled, lookup):
+    values = compiled.blank.copy()
+    values.update(zip(compiled.whole_coordinates, compiled.whole_getter(lookup)))
+    for coordinate, pattern, getter in compiled.inline:
+        values[coordinate] = pattern.format(*getter(lookup))
+    return values
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import re
+
+MANIFEST_VERSION = 1
+
+# Treatment names as sent by the GUI, in sheet order
+TREATMENT_NAMES = [
+    "Temperature", "Pulse", "Respiratory Rate", "MMCRT", "IV Fluids / Rate", "Additives",
+    "Check IVC", "Walk/Litter", "Urine (+/-)", "Stool (+/-)", "Vomit (+/-)", "Food / Water"
+]
+
+TIME_ROW = 5
+TIME_COLUMNS = [chr(i) for i in range(ord('D'), ord('Z') + 1)] + ['AA']
+LABEL_COLUMN = "C"
+
+PLACEHOLDER_RE = re.compile(r"^\{[^{}]*\}$")
+MED_PLACEHOLDER_RE = re.compile(r"^\{med(\d+)\}$")
+
+_manifests = {}
+
+def manifest_path_for(template_path):
+    """The manifest lives next to the template it describes"""
+    base, _ = os.path.splitext(template_path)
+    return f"{base}.manifest.json"
+
+def template_hash(template_path):
+    """SHA-256 of the template file contents"""
+    digest = hashlib.sha256()
+    with open(template_path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _label_key(value):
+    """Template labels wrap onto several lines ("MM\\nCRT"), so compare without whitespace"""
+    return "".join(str(value).split()).lower()
+
+def hour_columns(value_at):
+    """[column, hour] for every time column whose row-5 label, value_at(column), is an hour from 1 to 12"""
+    found = []
+    for column in TIME_COLUMNS:
+        try:
+            hour = int(str(value_at(column)))
+        except (ValueError, TypeError):
+            continue
+        if 1 <= hour <= 12:
+            found.append([column, hour])
+    return found
+
+def compile_template(template_path, digest=None):
+    """Scan the template once and record where everything that gets filled in lives"""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(template_path)
+    sheet = workbook.active
+
+    cells = {}
+    placeholders = {}
+    for row in sheet.iter_rows():
+        for cell in row:
+            if cell.value and isinstance(cell.value, str) and "{" in cell.value and "}" in cell.value:
+                cells[cell.coordinate] = cell.value
+                if PLACEHOLDER_RE.match(cell.value):
+                    placeholders.setdefault(cell.value, []).append(cell.coordinate)
+
+    # Row 5 holds the hour labels for the D..AA time columns
+    time_columns = hour_columns(lambda column: sheet[f"{column}{TIME_ROW}"].value)
+
+    # Rows whose label cell is merged with the row below span two sheet rows
+    merged_label_rows = set()
+    for merged_range in sheet.merged_cells.ranges:
+        if (merged_range.min_col == merged_range.max_col == 3
+                and merged_range.max_row == merged_range.min_row + 1):
+            merged_label_rows.add(merged_range.min_row)
+
+    wanted = {_label_key(name): name for name in TREATMENT_NAMES}
+    treatment_rows = {}
+    for row in range(TIME_ROW + 1, sheet.max_row + 1):
+        value = sheet[f"{LABEL_COLUMN}{row}"].value
+        if value is None:
+            continue
+        name = wanted.get(_label_key(value))
+        if name and name not in treatment_rows:
+            treatment_rows[name] = {"row": row, "merged": row in merged_label_rows}
+
+    medication_rows = {}
+    for token, coordinates in placeholders.items():
+        match = MED_PLACEHOLDER_RE.match(token)
+        if match:
+            medication_rows[int(match.group(1))] = sheet[coordinates[0]].row
+    medication_rows = [medication_rows[n] for n in sorted(medication_rows)]
+
+    return {
+        "version": MANIFEST_VERSION,
+        "template_hash": digest or template_hash(template_path),
+        "sheet": sheet.title,
+        "cells": cells,
+        "placeholders": placeholders,
+        "hour_columns": time_columns,
+        "treatment_rows": {name: treatment_rows[name] for name in TREATMENT_NAMES if name in treatment_rows},
+        "medication_rows": medication_rows
+    }
+
+def _read_manifest(manifest_path, digest):
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("template_hash") != digest:
+        return None
+    return manifest
+
+def _write_manifest(manifest_path, manifest):
+    # The template may sit in a read-only install or PyInstaller temp dir; an
+    # unwritable manifest just means compiling again next process
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, manifest_path)
+    except OSError as e:
+        print(f"Warning: could not write template manifest: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def load_manifest(template_path):
+    """Return the manifest for template_path, rebuilding it if the template changed"""
+    stat = os.stat(template_path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _manifests.get(template_path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    digest = template_hash(template_path)
+    manifest_path = manifest_path_for(template_path)
+    manifest = _read_manifest(manifest_path, digest)
+    if manifest is None:
+        print("Compiling template manifest...")
+        manifest = compile_template(template_path, digest)
+        _write_manifest(manifest_path, manifest)
+
+    _manifests[template_path] = (stamp, manifest)
+    return manifest
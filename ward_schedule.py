@@ -0,0 +1,142 @@
+import argparse
+
+import numpy as np
+
+from schedule import layout_for, parse_schedule
+from template_cache import TREATMENT_NAMES, load_manifest
+
+MAX_HOUR = 12
+
+def slot_table(layout):
+    """Boolean array [start_hour, frequency, slot] of the columns each schedule highlights.
+
+    Row-5 hour labels repeat, so a start hour may begin at several columns; a
+    schedule covers every column reachable from any of them. Frequencies at or
+    above the column count only hit the start columns, so they share the last
+    frequency row; frequency 0 is all False and marks "no schedule".
+    """
+    table = getattr(layout, "_table", None)
+    if table is None:
+        n = len(layout.columns)
+        hours = np.array(layout.hours, dtype=np.int64)
+        # starts[h, p]: column p carries hour label h
+        starts = (hours[None, :] == np.arange(MAX_HOUR + 1)[:, None]).astype(np.int32)
+        # steps[f, p, s]: slot s is reached from column p in steps of f
+        offset = np.arange(n)[None, :] - np.arange(n)[:, None]
+        frequencies = np.arange(n + 1)[:, None, None]
+        steps = (offset >= 0) & (offset % np.maximum(frequencies, 1) == 0) & (frequencies > 0)
+        table = (starts[None] @ steps.astype(np.int32)).transpose(1, 0, 2) > 0
+        layout._table = table
+    return table
+
+def table_index(layout, start_hour, frequency):
+    """Clamp a validated (start_hour, frequency) onto slot_table's axes"""
+    return start_hour, min(frequency, len(layout.columns))
+
+def _entry_schedule(entry):
+    start_hour = entry.get("start_hour", "")
+    frequency = entry.get("frequency", "")
+    # The form's placeholder text means the field was left empty
+    if not start_hour or not frequency or start_hour == "Start Hour" or frequency == "Frequency":
+        return None
+    return parse_schedule(start_hour, frequency, None, quiet=True)
+
+class WardSchedule:
+    """Every patient's treatment and medication schedules as one patient x item x slot array"""
+
+    def __init__(self, patients, layout, treatments=TREATMENT_NAMES):
+        self.layout = layout
+        self.patients = [data.get("patient", "") or data.get("chartnum", "") for data in patients]
+        medication_count = max((len(data.get("medications", [])) for data in patients), default=0)
+        self.items = list(treatments) + [f"med{i}" for i in range(1, medication_count + 1)]
+
+        # Labels per patient and item: treatment names, or the medication as written on the sheet
+        self.labels = []
+        starts = np.zeros((len(patients), len(self.items)), dtype=np.int64)
+        frequencies = np.zeros_like(starts)
+        for p, data in enumerate(patients):
+            labels = list(treatments)
+            entries = [data.get("treatments", {}).get(name, {}) for name in treatments]
+            for medication in data.get("medications", []):
+                labels.append(f"{medication.get('name', '')} {medication.get('dosage', '')}".strip())
+                entries.append(medication)
+            labels += [""] * (len(self.items) - len(labels))
+            self.labels.append(labels)
+            for i, entry in enumerate(entries):
+                schedule = _entry_schedule(entry)
+                if schedule:
+                    starts[p, i], frequencies[p, i] = table_index(layout, *schedule)
+
+        # One gather compiles the whole ward; unscheduled entries hit the all-False frequency 0 row
+        self.matrix = slot_table(layout)[starts, frequencies]
+
+    @classmethod
+    def from_manifest(cls, patients, manifest):
+        return cls(patients, layout_for(manifest), list(manifest["treatment_rows"]))
+
+    def slots_at(self, hour):
+        """Slot indexes whose row-5 label is hour (one per 12-hour half of the sheet)"""
+        return [index for index, label in enumerate(self.layout.hours) if label == hour]
+
+    def due(self, slots):
+        """(patient, item label) pairs due in any of the given slots"""
+        if isinstance(slots, int):
+            slots = [slots]
+        mask = self.matrix[:, :, slots].any(axis=2)
+        return [(self.patients[p], self.labels[p][i] or self.items[i]) for p, i in np.argwhere(mask)]
+
+    def due_at(self, hour):
+        return self.due(self.slots_at(hour))
+
+    def counts_per_slot(self):
+        """Scheduled doses and treatments per column across the ward"""
+        return self.matrix.sum(axis=(0, 1))
+
+    def counts_per_hour(self):
+        counts = self.counts_per_slot()
+        return [(column, hour, int(count)) for column, hour, count in
+                zip(self.layout.columns, self.layout.hours, counts)]
+
+    def collisions(self, minimum=2):
+        """(patient, column, item labels) where one patient has minimum or more items in the same slot"""
+        per_slot = self.matrix.sum(axis=1)
+        found = []
+        for p, slot in np.argwhere(per_slot >= minimum):
+            items = [self.labels[p][i] or self.items[i] for i in np.flatnonzero(self.matrix[p, :, slot])]
+            found.append((self.patients[p], self.layout.columns[slot], items))
+        return found
+
+def main(argv=None):
+    from batch import load_records
+    from flowsheet import resource_path
+
+    parser = argparse.ArgumentParser(prog="app.py ward",
+                                     description="Show what is due across a ward file of patient payloads")
+    parser.add_argument("input", help="JSONL or CSV file, one patient payload per record")
+    parser.add_argument("--hour", type=int, default=None, help="List everything due at this hour (1-12)")
+    parser.add_argument("--collisions", type=int, default=None, metavar="N",
+                        help="List patients with N or more items due in the same hour column")
+    args = parser.parse_args(argv)
+
+    patients = []
+    for number, data, error in load_records(args.input):
+        if error:
+            print(f"Record {number}: skipped ({error})")
+        else:
+            patients.append(data)
+
+    ward = WardSchedule.from_manifest(patients, load_manifest(resource_path("template.xlsx")))
+    print(f"{len(patients)} patient(s), {len(ward.items)} schedule item(s) each")
+
+    if args.hour is not None:
+        due = ward.due_at(args.hour)
+        print(f"Due at {args.hour}: {len(due)}")
+        for patient, item in due:
+            print(f"  {patient}: {item}")
+    if args.collisions is not None:
+        for patient, column, items in ward.collisions(args.collisions):
+            print(f"  {patient} column {column}: {', '.join(items)}")
+    if args.hour is None and args.collisions is None:
+        for column, hour, count in ward.counts_per_hour():
+            print(f"  {column:>2} ({hour:>2}): {count}")
+    return 0
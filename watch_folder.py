@@ -0,0 +1,349 @@
+# Watch-folder ingestion: order exports that the practice-management system
+# drops into an inbox folder are mapped onto the collect_data() schema,
+# rendered on a worker pool and written to an outbox folder. A journal of
+# export content hashes in the outbox means a restart never renders the same
+# export twice.
+import argparse
+import collections
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+
+from batch import normalize_payload, render_record
+from instrumentation import percentile
+from service import start_render_pool
+
+EXPORT_EXTENSIONS = (".json", ".jsonl", ".csv")
+JOURNAL_NAME = ".watch-journal.jsonl"
+STATS_NAME = ".watch-stats.json"
+LATENCY_WINDOW = 1000
+
+def load_mapping(path):
+    """{export field: collect_data() key} from a JSON file, or {} for exports already in that shape"""
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        mapping = json.load(f)
+    if not isinstance(mapping, dict):
+        raise ValueError("The field mapping must be a JSON object")
+    return mapping
+
+def map_record(record, mapping):
+    """Rename export fields to payload keys; fields that are not mapped keep their names"""
+    if not isinstance(record, dict):
+        raise ValueError(f"Expected an object, got {type(record).__name__}")
+    return {mapping.get(key, key): value for key, value in record.items()}
+
+def read_export(path):
+    """The raw records in one export: a JSON object or array, JSON lines, or CSV rows"""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            return list(csv.DictReader(f))
+    with open(path, encoding="utf-8-sig") as f:
+        text = f.read()
+    if path.lower().endswith(".jsonl"):
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    records = json.loads(text)
+    return records if isinstance(records, list) else [records]
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def output_name(export_path, number, count, data):
+    """Named after the export, so re-rendering after a crash overwrites instead of duplicating"""
+    from flowsheet import safe_filename
+
+    stem = safe_filename(os.path.splitext(os.path.basename(export_path))[0])
+    patient = safe_filename(data.get("patient", "").strip()) or "patient"
+    suffix = f"-{number}" if count > 1 else ""
+    return f"{stem}{suffix}-{patient}-Flow-Chart.xlsx"
+
+class Journal:
+    """Append-only record of every export handled, keyed by content hash"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)["sha256"])
+                    except (ValueError, KeyError):
+                        continue  # A line cut short by a crash
+        except FileNotFoundError:
+            pass
+
+    def __contains__(self, digest):
+        return digest in self.done
+
+    def record(self, entry):
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.done.add(entry["sha256"])
+
+class _Export:
+    """One export file between being picked up and being journaled"""
+
+    def __init__(self, path, digest, first_seen, count):
+        self.path = path
+        self.digest = digest
+        self.first_seen = first_seen
+        self.remaining = count
+        self.outputs = []
+        self.errors = []
+
+class FolderWatcher:
+    """Polls inbox for new exports and renders them into outbox.
+
+    A file is only read once its size and modification time have not changed
+    for settle seconds, so exports that are still being written are left
+    alone. At most max_in_flight records are queued on the worker pool at a
+    time; while it is full, new files simply wait in the inbox.
+    """
+
+    def __init__(self, inbox, outbox, workers=None, engine=None, settle=2.0, interval=1.0, mapping=None,
+                 max_in_flight=None):
+        self.inbox = inbox
+        self.outbox = outbox
+        self.workers = workers or os.cpu_count() or 1
+        self.engine = engine
+        self.settle = settle
+        self.interval = interval
+        self.mapping = mapping or {}
+        self.max_in_flight = max_in_flight or self.workers * 2
+        os.makedirs(outbox, exist_ok=True)
+        self.journal = Journal(os.path.join(outbox, JOURNAL_NAME))
+        self.slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.lock = threading.Lock()
+        self.executor = None
+
+        self.seen = {}          # file name -> [size, mtime_ns, first seen, last changed]
+        self.handled = set()    # (file name, size, mtime_ns) already journaled or in progress
+        self.active = {}        # digest -> _Export
+        self.waiting = 0
+        self.in_flight = 0
+        self.rendered = 0
+        self.failed = 0
+        self.files_done = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+
+    def scan(self, now=None):
+        """Paths of exports that have settled and have not been handled yet, oldest first"""
+        now = time.monotonic() if now is None else now
+        ready = []
+        present = set()
+        with os.scandir(self.inbox) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.name.lower().endswith(EXPORT_EXTENSIONS):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue  # Moved away between listing and stat
+                present.add(entry.name)
+                if (entry.name, stat.st_size, stat.st_mtime_ns) in self.handled:
+                    continue
+                state = self.seen.get(entry.name)
+                if state is None or state[0] != stat.st_size or state[1] != stat.st_mtime_ns:
+                    first_seen = state[2] if state else now
+                    self.seen[entry.name] = [stat.st_size, stat.st_mtime_ns, first_seen, now]
+                    continue
+                if now - state[3] >= self.settle:
+                    ready.append((state[2], entry.name))
+
+        for name in list(self.seen):
+            if name not in present:
+                del self.seen[name]
+        self.waiting = len(self.seen)
+        return [os.path.join(self.inbox, name) for _, name in sorted(ready)]
+
+    def ingest(self, path):
+        """Map one settled export and queue its records; blocks while the pool is full"""
+        name = os.path.basename(path)
+        size, mtime_ns, first_seen, _ = self.seen.pop(name)
+        try:
+            digest = file_digest(path)
+        except OSError as e:
+            self._retry(name, size, mtime_ns, first_seen, e)
+            return
+        if digest in self.journal:
+            self.handled.add((name, size, mtime_ns))
+            # Rendered before, perhaps before a restart; say so, since identical content is never rendered twice
+            print(f"{name}: same content as an export already in the journal; skipped")
+            return
+        if digest in self.active:
+            self.handled.add((name, size, mtime_ns))
+            print(f"{name}: same content as an export that is rendering now; skipped")
+            return
+
+        try:
+            payloads = [normalize_payload(map_record(record, self.mapping)) for record in read_export(path)]
+        except OSError as e:
+            self._retry(name, size, mtime_ns, first_seen, e)
+            return
+        except (ValueError, TypeError, csv.Error) as e:
+            # Only content that can never be read is journaled; the file is not retried until it changes
+            self.handled.add((name, size, mtime_ns))
+            print(f"{name}: skipped ({str(e)})")
+            self.journal.record({"file": name, "sha256": digest, "records": 0, "outputs": [], "errors": [str(e)],
+                                 "at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+            return
+        self.handled.add((name, size, mtime_ns))
+        if not payloads:
+            print(f"{name}: no records")
+            return
+
+        export = _Export(path, digest, first_seen, len(payloads))
+        with self.lock:
+            self.active[digest] = export
+        for number, data in enumerate(payloads, start=1):
+            final_path = os.path.join(self.outbox, output_name(path, number, len(payloads), data))
+            # Written under a hidden name and renamed, so nothing reads a half-written sheet
+            part_path = os.path.join(self.outbox, f".{os.path.basename(final_path)}.part")
+            self.slots.acquire()
+            with self.lock:
+                self.in_flight += 1
+            future = self.executor.submit(render_record, number, data, part_path, self.engine)
+            future.add_done_callback(lambda future, final_path=final_path, part_path=part_path:
+                                     self._finished(export, future, final_path, part_path))
+
+    def _retry(self, name, size, mtime_ns, first_seen, error):
+        """The export was moved, deleted or locked after the scan; look at it again on a later scan"""
+        print(f"{name}: not read yet ({str(error)}); will retry")
+        self.seen[name] = [size, mtime_ns, first_seen, time.monotonic()]
+
+    def _finished(self, export, future, final_path, part_path):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"path": None, "error": f"worker failed: {e}"}
+        if not result["error"]:
+            try:
+                os.replace(result["path"], final_path)
+            except OSError as e:
+                result["error"] = str(e)
+        if result["error"]:
+            # Nothing else will ever pick up a hidden part file
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+
+        with self.lock:
+            self.in_flight -= 1
+            if result["error"]:
+                self.failed += 1
+                export.errors.append(result["error"])
+                print(f"{os.path.basename(export.path)}: render failed ({result['error']})")
+            else:
+                self.rendered += 1
+                export.outputs.append(os.path.basename(final_path))
+                self.latencies.append(time.monotonic() - export.first_seen)
+            export.remaining -= 1
+            complete = export.remaining == 0
+            if complete:
+                del self.active[export.digest]
+                self.files_done += 1
+        self.slots.release()
+
+        if complete:
+            self.journal.record({"file": os.path.basename(export.path), "sha256": export.digest,
+                                 "records": len(export.outputs) + len(export.errors),
+                                 "outputs": sorted(export.outputs), "errors": export.errors,
+                                 "at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+            print(f"{os.path.basename(export.path)}: {len(export.outputs)} sheet(s) in "
+                  f"{time.monotonic() - export.first_seen:.2f}s")
+
+    def stats(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            in_flight = self.in_flight
+            active = len(self.active)
+
+        def pct(p):
+            value = percentile(latencies, p)
+            return None if value is None else round(value * 1000, 1)
+
+        return {
+            "backlog_files": self.waiting + active,
+            "records_in_flight": in_flight,
+            "max_in_flight": self.max_in_flight,
+            "files_done": self.files_done,
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "latency_ms": {"p50": pct(50), "p95": pct(95), "max": pct(100)},
+            "uptime_s": round(time.time() - self.started, 1)
+        }
+
+    def write_stats(self):
+        path = os.path.join(self.outbox, STATS_NAME)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.stats(), f, indent=1)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: could not write watch stats: {e}")
+
+    def idle(self):
+        with self.lock:
+            return not self.seen and not self.active and self.in_flight == 0
+
+    def run(self, stop=None, until_idle=False):
+        """Poll until stop (a threading.Event) is set, or with until_idle until the inbox is drained"""
+        stop = stop or threading.Event()
+        self.executor = start_render_pool(self.workers, self.engine)
+        print(f"Watching {self.inbox} -> {self.outbox} ({self.workers} workers)")
+        try:
+            while not stop.is_set():
+                for path in self.scan():
+                    self.ingest(path)
+                self.write_stats()
+                if until_idle and self.idle():
+                    break
+                stop.wait(self.interval)
+        finally:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+            self.write_stats()
+        return self.stats()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="app.py watch",
+                                     description="Render flow sheets for order exports dropped into a folder")
+    parser.add_argument("inbox", help="Folder the practice-management system writes exports into")
+    parser.add_argument("outbox", help="Folder to write the generated sheets into")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Render worker processes (default: CPU count)")
+    parser.add_argument("--engine", choices=["openpyxl", "xlsxpatch"], default=None)
+    parser.add_argument("--mapping", help="JSON file mapping export field names to flow sheet fields")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="Seconds a file must stay unchanged before it is read (default 2)")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between folder scans (default 1)")
+    parser.add_argument("--once", action="store_true", help="Exit once everything in the inbox is rendered")
+    args = parser.parse_args(argv)
+
+    watcher = FolderWatcher(args.inbox, args.outbox, workers=args.workers, engine=args.engine,
+                            settle=args.settle, interval=args.interval, mapping=load_mapping(args.mapping))
+    try:
+        stats = watcher.run(until_idle=args.once)
+    except KeyboardInterrupt:
+        stats = watcher.stats()
+        print("Watcher stopped")
+    print(f"{stats['rendered']} sheet(s) rendered, {stats['failed']} failed, "
+          f"p95 ingest-to-file {stats['latency_ms']['p95']} ms")
+    return 1 if stats["failed"] else 0
@@ -0,0 +1,312 @@
+# Render flow sheets by patching the template's XML parts directly. The output
+# only differs from template.xlsx in some shared strings and cell style indexes,
+# so instead of a full openpyxl load/save the template zip is copied entry by
+# entry and only the shared strings, flow sheet and styles parts are rewritten.
+import io
+import posixpath
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from instrumentation import span
+from sheet_plan import page_title, paginate, plan_sheet
+from style_registry import FILL_COLORS, derived_xf, fill_xml
+from template_cache import load_manifest
+
+ROW_RE = re.compile(r"<row\b[^>]*?(?:/>|>.*?</row>)", re.S)
+CELL_RE = re.compile(r"<c\s[^>]*?(?:/>|>.*?</c>)", re.S)
+XF_RE = re.compile(r"<xf\b[^>]*?(?:/>|>.*?</xf>)", re.S)
+ATTR_RE = re.compile(r'([\w:]+)="([^"]*)"')
+COORD_RE = re.compile(r"^([A-Z]+)(\d+)$")
+ILLEGAL_CHARACTERS_RE = re.compile(r"[\000-\010]|[\013-\014]|[\016-\037]")
+
+_templates = {}
+
+def column_index(letters):
+    """Convert a column letter ("AA") to its 1-based index"""
+    index = 0
+    for letter in letters:
+        index = index * 26 + (ord(letter) - 64)
+    return index
+
+def split_coordinate(coordinate):
+    match = COORD_RE.match(coordinate)
+    if not match:
+        raise ValueError(f"Invalid cell coordinate '{coordinate}'")
+    return match.group(1), int(match.group(2))
+
+def _attributes(tag):
+    """Attributes of an element's start tag, in document order"""
+    start = tag[:tag.index(">") + 1] if ">" in tag else tag
+    return dict(ATTR_RE.findall(start))
+
+def _resolve_target(base_dir, target):
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+class _Template:
+    """Everything about the template zip that does not change between renders"""
+
+    def __init__(self, template_path, sheet_title):
+        with zipfile.ZipFile(template_path) as archive:
+            self.entries = [(info, archive.read(info)) for info in archive.infolist()]
+        parts = {info.filename: data for info, data in self.entries}
+
+        # Locate the flow sheet and shared strings parts through the workbook relationships
+        workbook_xml = parts["xl/workbook.xml"].decode("utf-8")
+        rels_xml = parts["xl/_rels/workbook.xml.rels"].decode("utf-8")
+        targets = {}
+        for rel in re.findall(r"<Relationship\b[^>]*>", rels_xml):
+            attrs = _attributes(rel)
+            targets[attrs["Id"]] = (attrs["Type"].rsplit("/", 1)[-1], _resolve_target("xl", attrs["Target"]))
+
+        self.sheet_part = None
+        for sheet in re.findall(r"<sheet\b[^>]*>", workbook_xml):
+            attrs = _attributes(sheet)
+            if attrs.get("name") == sheet_title:
+                self.sheet_part = targets[attrs["r:id"]][1]
+        if self.sheet_part is None:
+            raise ValueError(f"Sheet '{sheet_title}' not found in template")
+
+        self.strings_part = next((target for kind, target in targets.values() if kind == "sharedStrings"), None)
+        if self.strings_part is None:
+            raise ValueError("Template has no shared strings part")
+        self.styles_part = next(target for kind, target in targets.values() if kind == "styles")
+
+        # Shared strings: keep the existing table and append new strings after it
+        sst = parts[self.strings_part].decode("utf-8")
+        self.sst_open = re.search(r"<sst\b[^>]*>", sst)
+        self.sst_body = sst[self.sst_open.end():sst.rindex("</sst>")]
+        self.string_count = len(re.findall(r"<si\b", self.sst_body))
+        self.string_index = {}
+        for index, item in enumerate(re.findall(r"<si\b[^>]*?(?:/>|>.*?</si>)", self.sst_body, re.S)):
+            plain = re.fullmatch(r"<si><t(?: xml:space=\"preserve\")?>([^<]*)</t></si>", item)
+            if plain:
+                text = plain.group(1).replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+                self.string_index.setdefault(text, index)
+        self.sst_xml = sst
+
+        # Styles: existing fills and cell formats, extended per render
+        styles = parts[self.styles_part].decode("utf-8")
+        self.styles_xml = styles
+        fills = re.search(r"<fills\b[^>]*>(.*?)</fills>", styles, re.S)
+        self.fill_count = len(re.findall(r"<fill\b", fills.group(1)))
+        cell_xfs = re.search(r"<cellXfs\b[^>]*>(.*?)</cellXfs>", styles, re.S)
+        self.cell_xfs = XF_RE.findall(cell_xfs.group(1))
+
+        # Sheet: pre-split sheetData into rows and cells so a render only rebuilds touched rows
+        sheet = parts[self.sheet_part].decode("utf-8")
+        data_match = re.search(r"<sheetData\s*/>|<sheetData>(.*?)</sheetData>", sheet, re.S)
+        self.sheet_head = sheet[:data_match.start()]
+        self.sheet_tail = sheet[data_match.end():]
+        self.rows = []
+        for row_xml in ROW_RE.findall(data_match.group(1) or ""):
+            row_number = int(_attributes(row_xml)["r"])
+            self.rows.append((row_number, row_xml))
+        self.row_positions = {number: position for position, (number, _) in enumerate(self.rows)}
+
+def _load_template(template_path, manifest):
+    key = (template_path, manifest["template_hash"])
+    template = _templates.get(key)
+    if template is None:
+        template = _Template(template_path, manifest["sheet"])
+        _templates[key] = template
+    return template
+
+def _string_xml(text):
+    if ILLEGAL_CHARACTERS_RE.search(text):
+        raise ValueError(f"Cell value contains characters not allowed in xlsx: {text!r}")
+    if text != text.strip():
+        return f'<si><t xml:space="preserve">{escape(text)}</t></si>'
+    return f"<si><t>{escape(text)}</t></si>"
+
+def _cell_xml(coordinate, attrs, inner, style, value, strings):
+    """Rebuild one <c> element with a new style and/or value"""
+    attrs = dict(attrs)
+    attrs["r"] = coordinate
+    if style is not None:
+        attrs["s"] = str(style)
+    if value is not None:
+        attrs.pop("t", None)
+        inner = ""
+        # Numbers and booleans become numeric and boolean cells, as openpyxl writes them
+        if isinstance(value, bool):
+            attrs["t"] = "b"
+            inner = f"<v>{int(value)}</v>"
+        elif isinstance(value, (int, float)):
+            inner = f"<v>{value!r}</v>"
+        elif value != "":
+            attrs["t"] = "s"
+            inner = f"<v>{strings(str(value))}</v>"
+    attributes = "".join(f' {name}="{val}"' for name, val in attrs.items())
+    if inner:
+        return f"<c{attributes}>{inner}</c>"
+    return f"<c{attributes}/>"
+
+def _patch_row(row_xml, row_number, changes, styled):
+    """Apply {column: (value, role)} changes to one <row> element"""
+    if row_xml is None:
+        open_tag, cells = f'<row r="{row_number}">', []
+    else:
+        end = row_xml.index(">") + 1
+        open_tag = row_xml[:end]
+        if open_tag.endswith("/>"):
+            open_tag = open_tag[:-2] + ">"
+            cells = []
+        else:
+            cells = CELL_RE.findall(row_xml[end:])
+
+    pending = dict(changes)
+    output = []
+
+    def emit_new(before_index):
+        for col_index in sorted(c for c in pending if before_index is None or c < before_index):
+            coordinate, value, role = pending.pop(col_index)
+            output.append(_cell_xml(coordinate, {}, "", styled(0, role), value, styled.strings))
+
+    for cell in cells:
+        attrs = _attributes(cell)
+        coordinate = attrs["r"]
+        col_index = column_index(split_coordinate(coordinate)[0])
+        emit_new(col_index)
+        change = pending.pop(col_index, None)
+        if change is None:
+            output.append(cell)
+            continue
+        _, value, role = change
+        inner = cell[cell.index(">") + 1:-len("</c>")] if not cell.endswith("/>") else ""
+        base_style = int(attrs.get("s", "0"))
+        style = styled(base_style, role) if role else None
+        output.append(_cell_xml(coordinate, attrs, inner, style, value, styled.strings))
+    emit_new(None)
+
+    if row_xml is not None and len(output) != len(cells):
+        # Inserted cells may fall outside the row's spans hint; drop it rather than lie
+        open_tag = re.sub(r'\sspans="[^"]*"', "", open_tag)
+    return open_tag + "".join(output) + "</row>"
+
+class _StyleTable:
+    """Per-render additions to the fills, cellXfs and shared strings tables"""
+
+    def __init__(self, template):
+        self.template = template
+        self.fill_ids = {}
+        self.new_fills = []
+        self.xf_ids = {}
+        self.new_xfs = []
+        self.string_ids = {}
+        self.new_strings = []
+
+    def fill_id(self, role):
+        color = FILL_COLORS[role]
+        fill_id = self.fill_ids.get(color)
+        if fill_id is None:
+            fill_id = self.template.fill_count + len(self.new_fills)
+            self.new_fills.append(fill_xml(role))
+            self.fill_ids[color] = fill_id
+        return fill_id
+
+    def __call__(self, base_style, role):
+        """cellXfs index for base_style with the fill for role"""
+        if role is None:
+            return base_style
+        fill_id = self.fill_id(role)
+        key = (base_style, fill_id)
+        xf_id = self.xf_ids.get(key)
+        if xf_id is None:
+            xf = derived_xf(self.template.cell_xfs[base_style], fill_id)
+            xf_id = len(self.template.cell_xfs) + len(self.new_xfs)
+            self.new_xfs.append(xf)
+            self.xf_ids[key] = xf_id
+        return xf_id
+
+    def strings(self, text):
+        """Shared string index for text, appending it to the table if needed"""
+        index = self.template.string_index.get(text)
+        if index is None:
+            index = self.string_ids.get(text)
+        if index is None:
+            index = self.template.string_count + len(self.new_strings)
+            self.new_strings.append(_string_xml(text))
+            self.string_ids[text] = index
+        return index
+
+    def sst_xml(self):
+        template = self.template
+        total = template.string_count + len(self.new_strings)
+        open_tag = re.sub(r'\s(?:count|uniqueCount)="\d+"', "", template.sst_open.group(0))
+        open_tag = open_tag[:-1] + f' count="{total}" uniqueCount="{total}">'
+        return open_tag + template.sst_body + "".join(self.new_strings) + "</sst>"
+
+    def styles_xml(self):
+        styles = self.template.styles_xml
+        if self.new_fills:
+            count = self.template.fill_count + len(self.new_fills)
+            styles = re.sub(r"<fills\b[^>]*>", f'<fills count="{count}">', styles, count=1)
+            styles = styles.replace("</fills>", "".join(self.new_fills) + "</fills>", 1)
+        if self.new_xfs:
+            count = len(self.template.cell_xfs) + len(self.new_xfs)
+            styles = re.sub(r"<cellXfs\b[^>]*>", f'<cellXfs count="{count}">', styles, count=1)
+            styles = styles.replace("</cellXfs>", "".join(self.new_xfs) + "</cellXfs>", 1)
+        return styles
+
+def _sheet_xml(template, values, fills, styled):
+    """Stream the sheet rows back out, rebuilding only rows with changes"""
+    changes = {}
+    for coordinate in set(values) | set(fills):
+        col, row = split_coordinate(coordinate)
+        changes.setdefault(row, {})[column_index(col)] = (coordinate, values.get(coordinate), fills.get(coordinate))
+
+    pieces = [template.sheet_head, "<sheetData>"]
+    for row_number, row_xml in template.rows:
+        # Rows the template lacks are slotted in before the next existing row
+        for missing in sorted(r for r in changes if r < row_number and r not in template.row_positions):
+            pieces.append(_patch_row(None, missing, changes.pop(missing), styled))
+        row_changes = changes.pop(row_number, None)
+        pieces.append(_patch_row(row_xml, row_number, row_changes, styled) if row_changes else row_xml)
+    for missing in sorted(changes):
+        pieces.append(_patch_row(None, missing, changes[missing], styled))
+    pieces.append("</sheetData>")
+    pieces.append(template.sheet_tail)
+    return "".join(pieces)
+
+def render_xlsx(data, template_path, stream=None):
+    """Render one flow sheet; return the xlsx bytes, or write them to stream"""
+    with span("template_load"):
+        manifest = load_manifest(template_path)
+        template = _load_template(template_path, manifest)
+
+    pages = paginate(data, manifest)
+    if len(pages) > 1:
+        # Continuation pages need extra sheets, which the multi-tab writer already knows how to add
+        from combined import write_tabs
+
+        output = stream if stream is not None else io.BytesIO()
+        write_tabs([(page_title(manifest["sheet"], page), plan_sheet(page_data, manifest))
+                    for page, page_data in enumerate(pages, start=1)], output, template_path)
+        return output.getvalue() if stream is None else None
+
+    values, fills = plan_sheet(data, manifest)
+
+    with span("apply_cells"):
+        styled = _StyleTable(template)
+        sheet_xml = _sheet_xml(template, values, fills, styled)
+        patched = {
+            template.sheet_part: sheet_xml.encode("utf-8"),
+            template.strings_part: styled.sst_xml().encode("utf-8"),
+            template.styles_part: styled.styles_xml().encode("utf-8")
+        }
+
+    with span("workbook_save"):
+        output = stream if stream is not None else io.BytesIO()
+        with zipfile.ZipFile(output, "w") as archive:
+            for info, content in template.entries:
+                entry = zipfile.ZipInfo(info.filename, info.date_time)
+                entry.compress_type = info.compress_type
+                entry.external_attr = info.external_attr
+                archive.writestr(entry, patched.get(info.filename, content))
+
+    if stream is None:
+        return output.getvalue()
+    return None